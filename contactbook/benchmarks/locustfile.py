@@ -0,0 +1,51 @@
+"""
+Load test against a running server:
+
+    pip install locust
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000
+
+Requires a data set from `manage.py generate_contacts`, run with the same BENCHMARK_USERNAME/BENCHMARK_PASSWORD
+(benchmark/benchmark by default): it also creates the user this load test logs in as.
+Use --headless --csv=<prefix> to store the results for comparisons between runs.
+"""
+import os
+import random
+
+from locust import HttpUser, between, task
+
+USERNAME = os.environ.get('BENCHMARK_USERNAME', 'benchmark')
+PASSWORD = os.environ.get('BENCHMARK_PASSWORD', 'benchmark')
+MAX_CONTACT_ID = int(os.environ.get('BENCHMARK_MAX_CONTACT_ID', '1000'))
+MAX_CONTACT_BOOK_ID = int(os.environ.get('BENCHMARK_MAX_CONTACT_BOOK_ID', '100'))
+SEARCH_TERMS = ('james', 'smith', 'kumar', 'example.com', 'priya')
+
+
+class ContactBookUser(HttpUser):
+    wait_time = between(0.1, 0.5)
+
+    def on_start(self):
+        response = self.client.post('/api/login/', json={'username': USERNAME, 'password': PASSWORD})
+        self.client.headers['Authorization'] = 'Token {}'.format(response.json()['token'])
+
+    @task(10)
+    def contact_retrieve(self):
+        self.client.get('/api/contact-retrieve/{}/'.format(random.randint(1, MAX_CONTACT_ID)),
+                        name='/api/contact-retrieve/[pk]/')
+
+    @task(5)
+    def contact_list(self):
+        self.client.get('/api/contact-list/', params={'page_size': 100, 'pagination': 'cursor'})
+
+    @task(3)
+    def contact_search(self):
+        self.client.get('/api/contact-list/', params={'search': random.choice(SEARCH_TERMS)},
+                        name='/api/contact-list/?search')
+
+    @task(2)
+    def contact_book_retrieve(self):
+        self.client.get('/api/contact-book-retrieve/{}/'.format(random.randint(1, MAX_CONTACT_BOOK_ID)),
+                        name='/api/contact-book-retrieve/[pk]/')
+
+    @task(1)
+    def contact_book_list(self):
+        self.client.get('/api/contact-book-list/', params={'page_size': 100})
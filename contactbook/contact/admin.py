@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from contact.models import ContactBook, Contact
+from contact.models import ContactBook, Contact, ContactBookDeletionJob, ContactBookStats
 
 
 class ContactBookAdmin(admin.ModelAdmin):
@@ -16,5 +16,19 @@ class ContactAdmin(admin.ModelAdmin):
     list_filter = ('deleted',)
 
 
+class ContactBookDeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'contact_book', 'status', 'processed', 'updated_on']
+    readonly_fields = ['id', 'contact_book', 'deleted_on', 'processed', 'error', 'created_by', 'created_on',
+                       'updated_on']
+    list_filter = ('status',)
+
+
+class ContactBookStatsAdmin(admin.ModelAdmin):
+    list_display = ['contact_book', 'live_count', 'deleted_count', 'last_contact_change_on']
+    readonly_fields = ['contact_book', 'live_count', 'deleted_count', 'last_contact_change_on', 'rebuilt_on']
+
+
 admin.site.register(ContactBook, ContactBookAdmin)
 admin.site.register(Contact, ContactAdmin)
+admin.site.register(ContactBookDeletionJob, ContactBookDeletionJobAdmin)
+admin.site.register(ContactBookStats, ContactBookStatsAdmin)
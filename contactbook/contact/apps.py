@@ -3,3 +3,20 @@ from django.apps import AppConfig
 
 class ContactConfig(AppConfig):
     name = 'contact'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework.authtoken.models import Token
+
+        from contact.authentication import invalidate_deleted_token, invalidate_user_tokens
+        from contact.db.monitoring import record_connect, check_persistent_connections
+
+        connection_created.connect(record_connect, dispatch_uid='contact.db.record_connect')
+        request_started.connect(check_persistent_connections, dispatch_uid='contact.db.check_persistent_connections')
+        post_delete.connect(invalidate_deleted_token, sender=Token,
+                            dispatch_uid='contact.authentication.invalidate_deleted_token')
+        post_save.connect(invalidate_user_tokens, sender=get_user_model(),
+                          dispatch_uid='contact.authentication.invalidate_user_tokens')
@@ -0,0 +1,185 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from contact.cache import get_cache
+
+DEFAULT_TOKEN_CACHE_MAX_ENTRIES = 10000
+DEFAULT_TOKEN_CACHE_LOCAL_TIMEOUT = 60
+DEFAULT_TOKEN_CACHE_TIMEOUT = 300
+DEFAULT_TOKEN_CACHE_SINGLE_PROCESS = False
+# user fields kept in the token caches, enough for authentication and permission checks
+AUTH_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+# backends whose entries (and revocation markers) are not seen by other worker processes
+PROCESS_LOCAL_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+class LRUCache(object):
+    """
+    Thread safe in-process LRU cache whose entries expire `timeout` seconds after they were set.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_token_cache = LRUCache(
+    max_entries=getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', DEFAULT_TOKEN_CACHE_MAX_ENTRIES),
+    timeout=getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', DEFAULT_TOKEN_CACHE_LOCAL_TIMEOUT))
+
+
+def make_token_key(key):
+    # never put raw tokens in the shared cache key space
+    return 'contactbook:token:{}'.format(hashlib.sha256(key.encode('utf8')).hexdigest())
+
+
+def make_revoked_key(key):
+    return '{}:revoked'.format(make_token_key(key))
+
+
+def get_token_cache_timeout():
+    return getattr(settings, 'TOKEN_CACHE_TIMEOUT', DEFAULT_TOKEN_CACHE_TIMEOUT)
+
+
+def get_shared_token_cache():
+    """
+    Cache holding tokens and revocation markers for all workers, None when the configured backend
+    lives in one process only and TOKEN_CACHE_SINGLE_PROCESS does not say there are no other workers:
+    a logout on one worker would then not reach the others.
+    """
+    cache = get_cache()
+    single_process = getattr(settings, 'TOKEN_CACHE_SINGLE_PROCESS', DEFAULT_TOKEN_CACHE_SINGLE_PROCESS)
+    if isinstance(cache, PROCESS_LOCAL_CACHE_BACKENDS) and not single_process:
+        return None
+    return cache
+
+
+def invalidate_token(key):
+    """
+    Drops a token from the shared cache and marks it revoked for as long as any worker may still hold it
+    in its local cache or a concurrent miss may still write it back to the shared cache, so a logout is
+    effective on every worker with the next request.
+    """
+    cache = get_cache()
+    cache.set(make_revoked_key(key), True, timeout=max(local_token_cache.timeout, get_token_cache_timeout()))
+    cache.delete(make_token_key(key))
+    local_token_cache.delete(key)
+
+
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    post_delete receiver of Token: tokens deleted by the admin, by a user deletion or anywhere else
+    than the logout stop authenticating with the next request as well.
+    """
+    invalidate_token(instance.key)
+
+
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save receiver of the user model: cached credentials carry the user's permission flags, a
+    deactivated or demoted user must not keep them until the cache expires. Saves not touching those
+    fields, like the last_login update of every login, keep the token cached.
+    """
+    if update_fields is not None and not set(update_fields) & set(AUTH_USER_FIELDS):
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def dump_credentials(user, token):
+    """
+    What authentication needs of a user and its token, the password hash and profile fields stay
+    in the database.
+    """
+    return {
+        'user': {name: getattr(user, name) for name in AUTH_USER_FIELDS},
+        'token': {'key': token.key, 'user_id': token.user_id, 'created': token.created},
+    }
+
+
+def load_instance(model, fields):
+    """
+    Instance of `model` as loaded from the database with only `fields`, the others are deferred.
+    """
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+def load_credentials(credentials):
+    user = load_instance(get_user_model(), credentials['user'])
+    token = load_instance(Token, credentials['token'])
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that resolves tokens from an in-process LRU, then from the shared cache
+    and only then from the database.
+
+    Every lookup checks the shared revocation marker set by `invalidate_token`, so the local LRU
+    saves the deserialization and the database query but not the shared cache round trip; a local
+    hit is one GET, a local miss fetches the marker and the shared entry in one round trip. Revoked
+    tokens are neither trusted from nor written back to the shared cache. Without a cache shared by
+    all workers (see `get_shared_token_cache`) every token is looked up in the database.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_shared_token_cache()
+        if cache is None:
+            return super().authenticate_credentials(key)
+        token_key, revoked_key = make_token_key(key), make_revoked_key(key)
+        credentials = local_token_cache.get(key)
+        if credentials is not None:
+            if not cache.get(revoked_key):
+                return load_credentials(credentials)
+            local_token_cache.delete(key)
+
+        cached = cache.get_many([token_key, revoked_key])
+        credentials = cached.get(token_key)
+        if cached.get(revoked_key) or credentials is None:
+            user, token = super().authenticate_credentials(key)
+            credentials = dump_credentials(user, token)
+            if not cache.get(revoked_key):
+                cache.set(token_key, credentials, timeout=get_token_cache_timeout())
+        local_token_cache.set(key, credentials)
+        return load_credentials(credentials)
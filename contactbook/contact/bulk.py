@@ -0,0 +1,212 @@
+import csv
+import io
+from collections import Counter, defaultdict
+from functools import reduce
+from itertools import islice
+from operator import itemgetter, or_
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from contact import stats
+from contact.models import ContactBook, Contact
+from contact.serializers import ContactImportSerializer, ContactSerializer
+
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+DEFAULT_BULK_RETRIEVE_MAX_KEYS = 1000
+DEFAULT_BULK_UPDATE_MAX_ROWS = 10000
+
+
+def get_import_batch_size():
+    return getattr(settings, 'CONTACT_IMPORT_BATCH_SIZE', DEFAULT_IMPORT_BATCH_SIZE)
+
+
+def get_bulk_retrieve_max_keys():
+    return getattr(settings, 'CONTACT_BULK_RETRIEVE_MAX_KEYS', DEFAULT_BULK_RETRIEVE_MAX_KEYS)
+
+
+def get_bulk_update_max_rows():
+    return getattr(settings, 'CONTACT_BULK_UPDATE_MAX_ROWS', DEFAULT_BULK_UPDATE_MAX_ROWS)
+
+
+def iter_batches(rows, batch_size):
+    """
+    Yields (offset, batch) pairs without materializing `rows`, so CSV uploads are read lazily.
+    """
+    iterator = iter(rows)
+    offset = 0
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield offset, batch
+        offset += len(batch)
+
+
+def read_csv_rows(uploaded_file):
+    """
+    :param uploaded_file: csv file with a header row, `name`, `email` and optionally `contact_book` columns
+    :return: iterator of row dicts
+    """
+    return csv.DictReader(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig'))
+
+
+class ContactImporter(object):
+    """
+    Validates and inserts contacts batch by batch: each batch costs one query to resolve contact books,
+    one query to find already existing (contact_book, email) pairs and chunked `bulk_create` INSERTs.
+    """
+
+    def __init__(self, user, contact_book=None, batch_size=None):
+        self.user = user
+        self.default_contact_book = contact_book
+        self.batch_size = batch_size or get_import_batch_size()
+        self.results = []
+        self.created = 0
+        self.failed = 0
+
+    def run(self, rows):
+        for offset, batch in iter_batches(rows, self.batch_size):
+            self.import_batch(offset, batch)
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'results': sorted(self.results, key=itemgetter('row')),
+        }
+
+    def fail(self, row, errors):
+        self.failed += 1
+        self.results.append({'row': row, 'status': 'failed', 'errors': errors})
+
+    def validate_row(self, row):
+        if isinstance(row, dict) and self.default_contact_book is not None and not row.get('contact_book'):
+            row = dict(row, contact_book=self.default_contact_book)
+        serializer = ContactImportSerializer(data=row)
+        serializer.is_valid()
+        return serializer
+
+    def import_batch(self, offset, batch):
+        valid_rows = []
+        for index, row in enumerate(batch, start=offset):
+            serializer = self.validate_row(row)
+            if serializer.errors:
+                self.fail(index, serializer.errors)
+            else:
+                valid_rows.append((index, serializer.validated_data))
+        if not valid_rows:
+            return
+
+        contact_book_ids = {data['contact_book'] for _, data in valid_rows}
+        emails = {data['email'] for _, data in valid_rows}
+        existing_contact_books = set(ContactBook.objects.filter(id__in=contact_book_ids).values_list('id', flat=True))
+        taken = set(Contact.objects.filter(
+            contact_book_id__in=existing_contact_books, email__in=emails).values_list('contact_book_id', 'email'))
+
+        to_create = []
+        for index, data in valid_rows:
+            key = (data['contact_book'], data['email'])
+            if data['contact_book'] not in existing_contact_books:
+                self.fail(index, {'contact_book': [
+                    'Invalid pk "{}" - object does not exist.'.format(data['contact_book'])]})
+            elif key in taken:
+                self.fail(index, {'non_field_errors': ['The fields contact_book, email must make a unique set.']})
+            else:
+                taken.add(key)
+                to_create.append((index, Contact(
+                    name=data['name'], email=data['email'], contact_book_id=data['contact_book'],
+                    created_by=self.user, changed_by=self.user)))
+
+        Contact.objects.bulk_create([contact for _, contact in to_create], batch_size=self.batch_size)
+        stats.contacts_created(Counter(contact.contact_book_id for _, contact in to_create))
+        self.created += len(to_create)
+        for index, contact in to_create:
+            self.results.append({'row': index, 'status': 'created', 'id': contact.id})
+
+
+def retrieve_result(contact):
+    if contact is None:
+        return {'status': 'missing'}
+    if contact.deleted:
+        return {'status': 'deleted'}
+    return {'status': 'found', 'contact': ContactSerializer(instance=contact).data}
+
+
+def retrieve_contacts(ids=None, keys=None):
+    """
+    Fetches contacts by ids or by (contact_book, email) keys with a single query.
+    Keys are matched per book, `(contact_book = b AND email IN (...)) OR ...`, so only the requested
+    keys are read, each through the (contact_book, email) unique index.
+    :return: one result per requested id/key, in request order
+    """
+    queryset = Contact.objects.select_related('contact_book', 'created_by', 'changed_by')
+    if ids is not None:
+        contacts = queryset.in_bulk(set(ids))
+        return [dict(retrieve_result(contacts.get(pk)), id=pk) for pk in ids]
+    emails = defaultdict(set)
+    for key in keys:
+        emails[key['contact_book']].add(key['email'])
+    condition = reduce(or_, (Q(contact_book_id=contact_book_id, email__in=contact_book_emails)
+                                      for contact_book_id, contact_book_emails in emails.items()))
+    contacts = {(contact.contact_book_id, contact.email): contact for contact in queryset.filter(condition)}
+    return [dict(retrieve_result(contacts.get((key['contact_book'], key['email']))), key=key) for key in keys]
+
+
+def lock_contact_ids(queryset, max_rows):
+    """
+    Locks the selected contacts for the rest of the transaction.
+    :return: ids of the selected contacts, None when there are more than `max_rows`
+    """
+    ids = list(queryset.select_for_update().order_by('id').values_list('id', flat=True)[:max_rows + 1])
+    if len(ids) > max_rows:
+        return None
+    return ids
+
+
+def find_move_conflicts(ids, contact_book):
+    """
+    :return: emails that would break unique (contact_book, email) if contacts `ids` moved to `contact_book`
+    """
+    selected = Contact.objects.filter(id__in=ids)
+    taken = Contact.objects.filter(contact_book=contact_book, email__in=selected.values('email')).exclude(
+        id__in=ids).values_list('email', flat=True)
+    repeated = selected.order_by().values('email').annotate(total=Count('id')).filter(
+        total__gt=1).values_list('email', flat=True)
+    return sorted(set(taken) | set(repeated))
+
+
+def update_contacts(ids, changes, chunk_size=None):
+    """
+    Applies the same `changes` to all contacts `ids` with one UPDATE per chunk of ids.
+    :return: number of updated contacts
+    """
+    chunk_size = chunk_size or get_import_batch_size()
+    updated = 0
+    for _, chunk in iter_batches(ids, chunk_size):
+        updated += Contact.objects.filter(id__in=chunk).update(**changes)
+    return updated
+
+
+def bulk_update_contacts(ids, changes, user):
+    now = timezone.now()
+    counts = stats.count_by_contact_book(ids)
+    updated = update_contacts(ids, dict(changes, changed_by=user, updated_on=now))
+    if 'contact_book' in changes:
+        stats.contacts_moved(counts, changes['contact_book'].id, changed_on=now)
+    else:
+        stats.contacts_touched(counts, changed_on=now)
+    return updated
+
+
+def bulk_soft_delete_contacts(ids, user):
+    """
+    Soft deletes live contacts `ids`, locked by `lock_contact_ids`.
+    """
+    now = timezone.now()
+    counts = stats.count_by_contact_book(ids)
+    deleted = update_contacts(ids, {'deleted': True, 'deleted_on': now, 'changed_by': user, 'updated_on': now})
+    stats.contacts_soft_deleted(counts, changed_on=now)
+    return deleted
@@ -0,0 +1,144 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from contact import routers
+
+DEFAULT_CACHE_TIMEOUT = 300
+DEFAULT_CACHE_LOCK_TIMEOUT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[getattr(settings, 'CONTACT_CACHE_ALIAS', 'default')]
+
+
+def get_cache_timeout():
+    return getattr(settings, 'CONTACT_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def get_cache_lock_timeout():
+    return getattr(settings, 'CONTACT_CACHE_LOCK_TIMEOUT', DEFAULT_CACHE_LOCK_TIMEOUT)
+
+
+def make_key(model, pk):
+    return 'contactbook:{}:{}'.format(model._meta.label_lower, int(pk))
+
+
+def make_version_key(model, pk):
+    return '{}:version'.format(make_key(model, pk))
+
+
+def get_versions(cache, version_keys):
+    """
+    Current version tokens of `version_keys`; missing (never set or evicted) tokens are created,
+    so an evicted token can never make an old entry look fresh again.
+    """
+    versions = cache.get_many(version_keys)
+    missing = [key for key in version_keys if key not in versions]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def is_fresh(cache, entry):
+    if not entry['versions']:
+        return True
+    return cache.get_many(list(entry['versions'])) == entry['versions']
+
+
+def wait_for_entry(cache, key, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_load(model, pk, loader, dependencies=()):
+    """
+    Read-through lookup of a serialized payload.
+    :param model: model class of the object
+    :param pk: primary key of the object
+    :param loader: callable returning the payload, None when the object does not exist
+    :param dependencies: (model, pk) pairs whose invalidation must also drop this entry, or a callable
+        returning them
+    :return: payload or None
+
+    The versions of the object and of its dependencies are read before the loader runs, so an
+    invalidation committed while loading leaves a stale entry instead of one looking fresh.
+
+    Only one caller per key rebuilds a missing entry, the others wait up to CONTACT_CACHE_LOCK_TIMEOUT
+    for it to show up before going to the database themselves.
+
+    Payloads loaded from a replica may lag behind the primary: they are cached for at most the
+    read-your-writes window and ignored by requests reading from the primary.
+    """
+    cache = get_cache()
+    key = make_key(model, pk)
+    from_replica = routers.current_replica() is not None
+
+    def usable(entry):
+        return entry is not None and (from_replica or not entry.get('replica')) and is_fresh(cache, entry)
+
+    entry = cache.get(key)
+    if usable(entry):
+        return entry['payload']
+
+    lock_key = '{}:lock'.format(key)
+    lock_timeout = get_cache_lock_timeout()
+    locked = cache.add(lock_key, 1, timeout=lock_timeout)
+    if not locked:
+        entry = wait_for_entry(cache, key, lock_timeout)
+        if usable(entry):
+            return entry['payload']
+    try:
+        if callable(dependencies):
+            dependencies = dependencies()
+        versions = get_versions(cache, [make_version_key(model, pk)] + [
+            make_version_key(*dependency) for dependency in dependencies])
+        payload = loader()
+        if payload is not None:
+            timeout = get_cache_timeout()
+            if from_replica:
+                timeout = min(timeout, routers.get_read_your_writes_window())
+            cache.set(key, {'payload': dict(payload), 'versions': versions, 'replica': from_replica}, timeout=timeout)
+        return payload
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def invalidate(model, pk):
+    """
+    Drops the cached payload of the object and of everything cached with it as a dependency,
+    once the current transaction commits.
+    """
+    def delete():
+        cache = get_cache()
+        cache.delete(make_key(model, pk))
+        cache.set(make_version_key(model, pk), uuid.uuid4().hex, timeout=None)
+
+    transaction.on_commit(delete)
+
+
+def invalidate_many(model, pks):
+    """
+    `invalidate` for many objects with one cache round trip per operation.
+    """
+    keys = [make_key(model, pk) for pk in pks]
+    versions = {make_version_key(model, pk): uuid.uuid4().hex for pk in pks}
+
+    def delete():
+        cache = get_cache()
+        cache.delete_many(keys)
+        cache.set_many(versions, timeout=None)
+
+    transaction.on_commit(delete)
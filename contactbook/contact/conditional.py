@@ -0,0 +1,109 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from contact import pagination
+from contact.utils import error_response
+
+PRECONDITION_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_IF_NONE_MATCH')
+
+
+def get_list_conditional_requests():
+    """
+    List validators need an aggregate over all filtered rows, so they are only taken along with
+    the exact count; the cached and estimate count strategies exist to avoid that scan.
+    """
+    return (getattr(settings, 'CONTACT_LIST_CONDITIONAL_REQUESTS', True)
+            and pagination.get_count_strategy() == pagination.COUNT_EXACT)
+
+
+def make_etag(request, *parts):
+    """
+    Strong ETag of `parts`, the negotiated media type is part of it since every renderer produces
+    different bytes from the same data.
+    """
+    signature = '|'.join(str(part) for part in (request.accepted_media_type,) + parts)
+    return quote_etag(hashlib.sha1(signature.encode()).hexdigest())
+
+
+def make_validators(request, key, timestamps, *parts):
+    """
+    :param key: identifies the resource, e.g. the model label and pk
+    :param timestamps: `updated_on` values the representation is built from, None entries are ignored
+    :return: (etag, last modified epoch seconds or None)
+    """
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    etag = make_etag(request, key, *[timestamp.isoformat() for timestamp in timestamps] + list(parts))
+    last_modified = timegm(max(timestamps).utctimetuple()) if timestamps else None
+    return etag, last_modified
+
+
+def payload_validators(request, model, payload):
+    """
+    Validators of a single object from its serialized payload, cached or fresh: any visible change,
+    fields of related objects included, changes the ETag and a cache hit needs no query.
+    """
+    updated_on = parse_datetime(payload['updated_on']) if payload.get('updated_on') else None
+    return make_validators(request, model._meta.label_lower, [updated_on], *sorted(payload.items()))
+
+
+def list_validators(request, queryset, fields=('updated_on',)):
+    """
+    Validators of a filtered list: the newest `fields` timestamp and the row count, which also
+    changes when rows leave the set. The page itself is part of the URL. The exact count is taken
+    in the same aggregate query and reused by the paginator.
+    :return: (validators, (count, count strategy))
+    """
+    aggregates = {'max_{}'.format(index): Max(field) for index, field in enumerate(fields)}
+    result = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+    timestamps = [result['max_{}'.format(index)] for index in range(len(fields))]
+    validators = make_validators(request, queryset.model._meta.label_lower, timestamps, result['count'])
+    return validators, (result['count'], pagination.COUNT_EXACT)
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified(request, validators):
+    """
+    304 response when If-None-Match or If-Modified-Since show the client's copy is current, None otherwise.
+    """
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None and response.status_code == status.HTTP_304_NOT_MODIFIED:
+        return set_validators(HttpResponseNotModified(), validators)
+    return None
+
+
+def has_preconditions(request):
+    return any(header in request.META for header in PRECONDITION_HEADERS)
+
+
+def precondition_failed(request, model, serializer_class, instance, msg):
+    """
+    412 response when If-Match or If-Unmodified-Since show the client would overwrite a newer
+    version of `instance` than the payload it fetched, None otherwise. `instance` is only
+    serialized when the request is conditional.
+    """
+    if not has_preconditions(request):
+        return None
+    validators = payload_validators(request, model, serializer_class(instance).data)
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None and response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+        return set_validators(error_response(
+            status=status.HTTP_412_PRECONDITION_FAILED, msg=msg,
+            data={"error": "The resource was modified, please fetch it again"}), validators)
+    return None
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from contact.db.pool import get_pool, DEFAULT_HEALTH_CHECK_INTERVAL
+
+_lock = threading.Lock()
+_counters = defaultdict(lambda: {'connects': 0, 'health_checks': 0, 'health_check_failures': 0})
+
+
+def get_health_check_interval():
+    return getattr(settings, 'CONTACT_DB_HEALTH_CHECK_INTERVAL', DEFAULT_HEALTH_CHECK_INTERVAL)
+
+
+def count(alias, name):
+    with _lock:
+        _counters[alias][name] += 1
+
+
+def record_connect(sender, connection, **kwargs):
+    connection.health_checked_at = time.monotonic()
+    count(connection.alias, 'connects')
+
+
+def check_persistent_connections(**kwargs):
+    """
+    Closes persistent connections (CONN_MAX_AGE > 0) that fail a `SELECT 1` at request start, checked
+    at most every CONTACT_DB_HEALTH_CHECK_INTERVAL seconds, so a restarted or failed over database
+    costs one reconnect instead of a failed request. Pooled connections are checked by the pool.
+    """
+    interval = get_health_check_interval()
+    if interval is None:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.settings_dict.get('POOL') is not None:
+            continue
+        if now - getattr(connection, 'health_checked_at', now) < interval:
+            continue
+        connection.health_checked_at = now
+        count(connection.alias, 'health_checks')
+        if not connection.is_usable():
+            count(connection.alias, 'health_check_failures')
+            connection.close()
+
+
+def get_connection_stats():
+    """
+    Per process connection metrics of every database alias.
+    """
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.databases[alias]
+        pool = get_pool(alias) if settings_dict.get('POOL') is not None else None
+        with _lock:
+            counters = dict(_counters[alias])
+        stats[alias] = dict(
+            counters,
+            engine=settings_dict['ENGINE'],
+            conn_max_age=settings_dict['CONN_MAX_AGE'],
+            pool=pool.stats() if pool is not None else None,
+        )
+    return stats
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_POOL_TIMEOUT = 10
+DEFAULT_POOL_MAX_AGE = 600
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def get_pool(alias):
+    return _pools.get(alias)
+
+
+def get_or_create_pool(alias, **kwargs):
+    """
+    The pool of a database alias, one per process shared by all threads.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(**kwargs)
+    return pool
+
+
+class ConnectionPool(object):
+    """
+    Thread safe pool of at most `max_size` DB-API connections opened by `connect`.
+
+    Checkouts reuse the most recently returned idle connection. Connections idle for more than
+    `health_check_interval` seconds are checked with `check` first and replaced when broken, connections
+    older than `max_age` seconds are replaced. When every connection is in use, checkouts wait up to
+    `timeout` seconds for one to be returned and then raise PoolTimeout.
+    """
+
+    def __init__(self, connect, check, max_size=DEFAULT_POOL_MAX_SIZE, timeout=DEFAULT_POOL_TIMEOUT,
+                 max_age=DEFAULT_POOL_MAX_AGE, health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        if max_size < 1:
+            raise ImproperlyConfigured('Connection pool MAX_SIZE must be at least 1')
+        self.connect = connect
+        self.check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        # (connection, opened at, returned at), most recently returned last
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self.metrics = {
+            'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+            'opened': 0, 'discarded': 0, 'health_checks': 0, 'health_check_failures': 0,
+        }
+
+    def checkout(self):
+        with self._condition:
+            started = None
+            while not self._idle and self._size >= self.max_size:
+                if started is None:
+                    started = time.monotonic()
+                    self.metrics['waits'] += 1
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    self.metrics['wait_seconds'] += time.monotonic() - started
+                    raise PoolTimeout('No database connection available within {}s'.format(self.timeout))
+                self._condition.wait(remaining)
+            if started is not None:
+                self.metrics['wait_seconds'] += time.monotonic() - started
+            self.metrics['checkouts'] += 1
+            if self._idle:
+                connection, opened_at, returned_at = self._idle.pop()
+            else:
+                connection = opened_at = returned_at = None
+            # reserves the slot while connecting or checking outside of the lock
+            self._size += connection is None
+
+        if connection is not None:
+            connection = self._revalidate(connection, opened_at, returned_at)
+        if connection is None:
+            connection = self._open()
+        return connection
+
+    def _revalidate(self, connection, opened_at, returned_at):
+        """
+        :return: `connection`, or None when it was closed; its slot then goes to the replacement
+        """
+        now = time.monotonic()
+        healthy = True
+        if self.max_age is not None and now - opened_at >= self.max_age:
+            healthy = False
+        elif self.health_check_interval is not None and now - returned_at >= self.health_check_interval:
+            self._count('health_checks')
+            if not self.check(connection):
+                self._count('health_check_failures')
+                healthy = False
+        if healthy:
+            return connection
+        with self._condition:
+            self._opened_at.pop(id(connection), None)
+            self.metrics['discarded'] += 1
+        self._close_quietly(connection)
+        return None
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            self._release_slot()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = time.monotonic()
+            self.metrics['opened'] += 1
+        return connection
+
+    def checkin(self, connection, discard=False):
+        with self._condition:
+            opened_at = self._opened_at.get(id(connection))
+            if opened_at is not None and not discard:
+                self._idle.append((connection, opened_at, time.monotonic()))
+                self._condition.notify()
+                return
+        if opened_at is None:
+            # not opened by this pool, it holds no slot
+            self._close_quietly(connection)
+            return
+        self._close(connection)
+        self._count('discarded')
+
+    def _close(self, connection):
+        with self._condition:
+            self._opened_at.pop(id(connection), None)
+        self._close_quietly(connection)
+        self._release_slot()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _count(self, name):
+        with self._condition:
+            self.metrics[name] += 1
+
+    def close_idle(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return dict(self.metrics, max_size=self.max_size, open=self._size, idle=len(self._idle),
+                        in_use=self._size - len(self._idle))
@@ -0,0 +1,56 @@
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from contact.db.monitoring import get_health_check_interval
+from contact.db.pool import get_or_create_pool, get_pool, DEFAULT_POOL_MAX_SIZE, DEFAULT_POOL_TIMEOUT, \
+    DEFAULT_POOL_MAX_AGE
+
+
+def is_connection_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend sharing one ConnectionPool per alias between the threads of a process.
+    Closing the connection (every request end with CONN_MAX_AGE = 0) returns it to the pool.
+    DATABASES[alias]['POOL'] takes MAX_SIZE, TIMEOUT and MAX_AGE.
+    """
+
+    def get_new_connection(self, conn_params):
+        pool_options = self.settings_dict.get('POOL', {})
+        pool = get_or_create_pool(
+            self.alias,
+            connect=lambda: base.Database.connect(**conn_params),
+            check=is_connection_usable,
+            max_size=pool_options.get('MAX_SIZE', DEFAULT_POOL_MAX_SIZE),
+            timeout=pool_options.get('TIMEOUT', DEFAULT_POOL_TIMEOUT),
+            max_age=pool_options.get('MAX_AGE', DEFAULT_POOL_MAX_AGE),
+            health_check_interval=get_health_check_interval(),
+        )
+        connection = pool.checkout()
+        # same isolation level handling as the stock backend
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        pool = get_pool(self.alias)
+        # closed inside an atomic block the wrapper keeps using the connection object, don't share it
+        discard = connection.closed or self.in_atomic_block or (self.errors_occurred and not self.is_usable())
+        if not discard and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                discard = True
+        pool.checkin(connection, discard=discard)
@@ -0,0 +1,126 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from contact.bulk import iter_batches
+from contact.cache import get_cache
+from contact.models import Contact
+
+DEFAULT_DUPLICATE_CHUNK_SIZE = 5000
+DEFAULT_DUPLICATE_CACHE_TIMEOUT = 600
+
+
+def get_duplicate_chunk_size():
+    return getattr(settings, 'CONTACT_DUPLICATE_CHUNK_SIZE', DEFAULT_DUPLICATE_CHUNK_SIZE)
+
+
+def get_duplicate_cache_timeout():
+    return getattr(settings, 'CONTACT_DUPLICATE_CACHE_TIMEOUT', DEFAULT_DUPLICATE_CACHE_TIMEOUT)
+
+
+def normalized_email():
+    """
+    Lowercased, trimmed email; compiles to the expression of contact_contact_email_normalized_idx.
+    """
+    return Lower(Trim('email'))
+
+
+def normalize_email(email):
+    # SQL TRIM only strips spaces
+    return email.strip(' ').lower()
+
+
+def email_partition(email, partitions):
+    """
+    Stable partition of a normalized email, Python's own hash() differs between processes.
+    """
+    return int.from_bytes(hashlib.blake2b(email.encode(), digest_size=8).digest(), 'big') % partitions
+
+
+def iter_live_contacts(chunk_size):
+    """
+    (id, contact_book_id, email) of all live contacts, one id range query per chunk.
+    """
+    last_id = 0
+    while True:
+        rows = list(Contact.objects.filter(deleted=False, id__gt=last_id).order_by('id').values_list(
+            'id', 'contact_book_id', 'email')[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def make_cluster(email, contacts):
+    contacts = sorted(contacts, key=lambda contact: (contact['contact_book'], contact['id']))
+    return {
+        'email': email,
+        'contact_books': sorted({contact['contact_book'] for contact in contacts}),
+        'contacts': contacts,
+    }
+
+
+def find_duplicate_clusters(partitions=1, chunk_size=None):
+    """
+    Clusters of live contacts sharing a normalized email, in any or the same contact book.
+
+    Every pass scans the contacts in id chunks and hash groups the emails of one partition in memory,
+    so memory is bounded by roughly 1/`partitions` of the distinct emails while the database only
+    serves short index range scans instead of a GROUP BY or self join over the whole table.
+    """
+    chunk_size = chunk_size or get_duplicate_chunk_size()
+    for partition in range(partitions):
+        groups = defaultdict(list)
+        for pk, contact_book_id, email in iter_live_contacts(chunk_size):
+            email = normalize_email(email)
+            if partitions == 1 or email_partition(email, partitions) == partition:
+                groups[email].append({'id': pk, 'contact_book': contact_book_id})
+        for email, contacts in groups.items():
+            if len(contacts) > 1:
+                yield make_cluster(email, contacts)
+
+
+def find_contact_book_duplicates(contact_book_id, chunk_size=None):
+    """
+    Clusters of the live contacts of a book whose normalized email is also used by other live
+    contacts, in other books or in the same one. Each chunk of the book's emails is one lookup on
+    the normalized email index.
+    """
+    chunk_size = chunk_size or get_duplicate_chunk_size()
+    emails = {normalize_email(email) for email in Contact.objects.filter(
+        contact_book_id=contact_book_id, deleted=False).values_list('email', flat=True).iterator()}
+    clusters = []
+    for _, chunk in iter_batches(sorted(emails), chunk_size):
+        groups = defaultdict(list)
+        rows = Contact.objects.annotate(normalized_email=normalized_email()).filter(
+            normalized_email__in=chunk, deleted=False).order_by().values_list(
+            'id', 'contact_book_id', 'normalized_email')
+        for pk, book_id, email in rows:
+            groups[email].append({'id': pk, 'contact_book': book_id})
+        clusters.extend(make_cluster(email, contacts) for email, contacts in groups.items() if len(contacts) > 1)
+    return sorted(clusters, key=lambda cluster: cluster['email'])
+
+
+def make_duplicates_key(contact_book_id):
+    return 'contactbook:duplicates:{}'.format(int(contact_book_id))
+
+
+def get_contact_book_duplicates(contact_book_id, refresh=False):
+    """
+    `find_contact_book_duplicates` report cached per book for CONTACT_DUPLICATE_CACHE_TIMEOUT seconds.
+    Writes to any book can change it, so it is not invalidated but ages out; `refresh` recomputes it.
+    """
+    cache = get_cache()
+    key = make_duplicates_key(contact_book_id)
+    report = None if refresh else cache.get(key)
+    if report is None:
+        report = {
+            'contact_book': int(contact_book_id),
+            'clusters': find_contact_book_duplicates(contact_book_id),
+            'computed_on': timezone.now().isoformat(),
+        }
+        cache.set(key, report, timeout=get_duplicate_cache_timeout())
+    return report
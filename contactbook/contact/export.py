@@ -0,0 +1,89 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework import serializers
+
+from contact.models import Contact
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('email', 'email'),
+    ('created_on', 'created_on'),
+    ('updated_on', 'updated_on'),
+    ('created_by', 'created_by__username'),
+    ('changed_by', 'changed_by__username'),
+)
+DATETIME_FIELDS = ('created_on', 'updated_on')
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'CONTACT_EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+
+
+class Echo(object):
+    """
+    File-like object for csv.writer that hands back the formatted line instead of buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_contact_rows(contact_book_id, chunk_size=None):
+    """
+    Yields live contacts of a contact book as dicts keyed by the ContactSerializer field names.
+    Rows come from `values_list(...).iterator()`, a server-side cursor on PostgreSQL, so memory
+    stays constant however large the contact book is.
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    datetime_field = serializers.DateTimeField()
+    names = [name for name, _ in EXPORT_FIELDS]
+    queryset = Contact.objects.filter(contact_book_id=contact_book_id, deleted=False).order_by('id').values_list(
+        *[lookup for _, lookup in EXPORT_FIELDS])
+    for values in queryset.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, values))
+        for name in DATETIME_FIELDS:
+            row[name] = datetime_field.to_representation(row[name])
+        yield row
+
+
+def iter_chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_csv(contact_book_id, chunk_size=None):
+    chunk_size = chunk_size or get_export_chunk_size()
+    writer = csv.writer(Echo())
+    names = [name for name, _ in EXPORT_FIELDS]
+    # header goes out before the first query so the client gets its first byte right away
+    yield writer.writerow(names)
+    lines = (writer.writerow([row[name] for name in names]) for row in iter_contact_rows(contact_book_id, chunk_size))
+    yield from iter_chunks(lines, chunk_size)
+
+
+def stream_ndjson(contact_book_id, chunk_size=None):
+    chunk_size = chunk_size or get_export_chunk_size()
+    lines = (json.dumps(row) + '\n' for row in iter_contact_rows(contact_book_id, chunk_size))
+    yield from iter_chunks(lines, chunk_size)
+
+
+EXPORT_STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import os
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from contact import stats
+from contact.models import ContactBook, Contact
+from contact.serializers import ContactImportSerializer
+
+FILE_FORMATS = ('csv', 'ndjson')
+STAGE_TABLE = 'contact_import_stage'
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'json': 'ndjson'}.get(extension, extension)
+
+
+def read_contact_file(path, file_format):
+    """
+    Streams the rows of a csv file with a header row or of a newline delimited JSON file as dicts,
+    never holding more than one row of the file in memory.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        if file_format == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def validate_rows(offset, rows, default_contact_book=None):
+    """
+    Validates rows with the bulk import rules (ContactSerializer's email and name limits).
+    :return: (valid (row, validated data) pairs, failed (row, errors) pairs)
+    """
+    valid, failed = [], []
+    for index, row in enumerate(rows, start=offset):
+        if not isinstance(row, dict):
+            failed.append((index, {'non_field_errors': ['Invalid row']}))
+            continue
+        if default_contact_book is not None and not row.get('contact_book'):
+            row = dict(row, contact_book=default_contact_book)
+        serializer = ContactImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            failed.append((index, serializer.errors))
+    return valid, failed
+
+
+def copy_contacts(rows, user_id):
+    """
+    Inserts (name, email, contact_book) rows with COPY into a temporary table and one INSERT ... ON CONFLICT DO
+    NOTHING from it, so rows already imported (by an earlier run or a parallel batch) are skipped instead of
+    failing the batch. PostgreSQL only.
+    :return: created contacts per contact book
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    table = Contact._meta.db_table
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE {} (name varchar(255), email varchar(254), contact_book_id integer) '
+                       'ON COMMIT DROP'.format(STAGE_TABLE))
+        cursor.copy_expert('COPY {} (name, email, contact_book_id) FROM STDIN WITH (FORMAT csv)'.format(STAGE_TABLE),
+                           buffer)
+        cursor.execute(
+            'INSERT INTO {} (name, email, contact_book_id, created_by_id, changed_by_id, created_on, updated_on, '
+            'deleted) SELECT name, email, contact_book_id, %s, %s, %s, %s, false FROM {} '
+            'ON CONFLICT (contact_book_id, email) DO NOTHING RETURNING contact_book_id'.format(table, STAGE_TABLE),
+            [user_id, user_id, now, now])
+        return Counter(contact_book_id for contact_book_id, in cursor.fetchall())
+
+
+def create_contacts(rows, user_id):
+    """
+    `copy_contacts` for other databases: existing (contact_book, email) pairs are looked up first and
+    the rest inserted with bulk_create.
+    """
+    taken = set(Contact.objects.filter(contact_book_id__in={row[2] for row in rows},
+                                       email__in={row[1] for row in rows}).values_list('contact_book_id', 'email'))
+    contacts = []
+    for name, email, contact_book_id in rows:
+        if (contact_book_id, email) not in taken:
+            taken.add((contact_book_id, email))
+            contacts.append(Contact(name=name, email=email, contact_book_id=contact_book_id,
+                                    created_by_id=user_id, changed_by_id=user_id))
+    Contact.objects.bulk_create(contacts, batch_size=len(contacts) or 1)
+    return Counter(contact.contact_book_id for contact in contacts)
+
+
+def import_batch(number, offset, rows, user_id=None, default_contact_book=None):
+    """
+    Validates and writes one batch of file rows in a single transaction, the unit of work of a
+    worker process and of a checkpoint.
+    :return: batch number, created and skipped (already existing) counts and failed (row, errors) pairs
+    """
+    valid, failed = validate_rows(offset, rows, default_contact_book)
+    contact_book_ids = set(ContactBook.objects.filter(
+        id__in={data['contact_book'] for _, data in valid}).values_list('id', flat=True))
+    to_write = []
+    for index, data in valid:
+        if data['contact_book'] in contact_book_ids:
+            to_write.append((data['name'], data['email'], data['contact_book']))
+        else:
+            failed.append((index, {'contact_book': [
+                'Invalid pk "{}" - object does not exist.'.format(data['contact_book'])]}))
+    created = Counter()
+    if to_write:
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                created = copy_contacts(to_write, user_id)
+            else:
+                created = create_contacts(to_write, user_id)
+            stats.contacts_created(created)
+    total = sum(created.values())
+    return {'batch': number, 'created': total, 'skipped': len(to_write) - total, 'failed': sorted(failed)}
+
+
+class Checkpoint(object):
+    """
+    Completed batches of an import, persisted after every batch so an interrupted import resumes
+    with the first unfinished one. Batches finish out of order: all batches below `completed_below`
+    are done, `completed` holds the ones done above it.
+    """
+
+    def __init__(self, path, source, batch_size):
+        self.path = path
+        self.source = source
+        self.batch_size = batch_size
+        self.completed_below = 0
+        self.completed = set()
+        self.totals = {'created': 0, 'skipped': 0, 'failed': 0}
+
+    @classmethod
+    def load(cls, path, source, batch_size):
+        checkpoint = cls(path, source, batch_size)
+        if path is None or not os.path.exists(path):
+            return checkpoint
+        with open(path) as stream:
+            state = json.load(stream)
+        if state['source'] != source or state['batch_size'] != batch_size:
+            raise ValueError('Checkpoint {} was written for another file or batch size'.format(path))
+        checkpoint.completed_below = state['completed_below']
+        checkpoint.completed = set(state['completed'])
+        checkpoint.totals = state['totals']
+        return checkpoint
+
+    def is_done(self, number):
+        return number < self.completed_below or number in self.completed
+
+    def done(self, result):
+        self.completed.add(result['batch'])
+        while self.completed_below in self.completed:
+            self.completed.remove(self.completed_below)
+            self.completed_below += 1
+        self.totals['created'] += result['created']
+        self.totals['skipped'] += result['skipped']
+        self.totals['failed'] += len(result['failed'])
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        state = {
+            'source': self.source,
+            'batch_size': self.batch_size,
+            'completed_below': self.completed_below,
+            'completed': sorted(self.completed),
+            'totals': self.totals,
+        }
+        temporary = '{}.tmp'.format(self.path)
+        with open(temporary, 'w') as stream:
+            json.dump(state, stream)
+        os.replace(temporary, self.path)
+
+
+def describe_source(path):
+    """
+    Identity of an input file for checkpoints: a different or changed file must not resume one.
+    """
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'modified': int(stat.st_mtime)}
@@ -0,0 +1,194 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('contact.slow_requests')
+
+DEFAULT_SLOW_REQUEST_SECONDS = None
+DEFAULT_SLOW_REQUEST_MAX_QUERIES = 20
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name, help, buckets of the per request histograms, labelled by view (url name), method and status
+HISTOGRAMS = (
+    ('contactbook_request_duration_seconds',
+     'Time from request to rendered response, or to the sent body of streaming responses.', LATENCY_BUCKETS),
+    ('contactbook_request_db_queries', 'Database queries per request.', QUERY_COUNT_BUCKETS),
+    ('contactbook_request_db_duration_seconds', 'Time spent executing database queries per request.',
+     LATENCY_BUCKETS),
+    ('contactbook_request_serialize_duration_seconds', 'Time spent serializing payloads per request.',
+     LATENCY_BUCKETS),
+    ('contactbook_request_render_duration_seconds', 'Time spent rendering the response body per request.',
+     LATENCY_BUCKETS),
+    ('contactbook_response_size_bytes', 'Size of non streaming response bodies.', SIZE_BUCKETS),
+)
+
+_state = threading.local()
+
+
+def get_slow_request_seconds():
+    return getattr(settings, 'CONTACT_SLOW_REQUEST_SECONDS', DEFAULT_SLOW_REQUEST_SECONDS)
+
+
+def get_slow_request_max_queries():
+    return getattr(settings, 'CONTACT_SLOW_REQUEST_MAX_QUERIES', DEFAULT_SLOW_REQUEST_MAX_QUERIES)
+
+
+class RequestRecord(object):
+    """
+    Timings of the request being served by the current thread.
+    """
+
+    def __init__(self, capture_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        # (sql, seconds) of every query, only kept for the slow request log
+        self.sql = [] if capture_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        `connection.execute_wrapper` counting and timing every query.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if self.sql is not None:
+                self.sql.append((sql, duration))
+
+
+def start_request(capture_sql=False):
+    _state.record = RequestRecord(capture_sql=capture_sql)
+    return _state.record
+
+
+def finish_request():
+    _state.record = None
+
+
+def current_record():
+    return getattr(_state, 'record', None)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Adds the time spent in the block to `phase` ('serialize' or 'render') of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = current_record()
+        if record is not None:
+            name = '{}_time'.format(phase)
+            setattr(record, name, getattr(record, name) + time.perf_counter() - started)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry(object):
+    """
+    Per process request histograms keyed by (view, method, status).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name, _, _ in HISTOGRAMS}
+
+    def observe(self, labels, values):
+        with self.lock:
+            for name, _, buckets in HISTOGRAMS:
+                value = values.get(name)
+                if value is None:
+                    continue
+                histogram = self.histograms[name].get(labels)
+                if histogram is None:
+                    histogram = self.histograms[name][labels] = Histogram(buckets)
+                histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            for histograms in self.histograms.values():
+                histograms.clear()
+
+    def exposition(self):
+        """
+        Prometheus text exposition format (version 0.0.4) of all histograms.
+        """
+        lines = []
+        with self.lock:
+            for name, help_text, buckets in HISTOGRAMS:
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} histogram'.format(name))
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    label_text = format_labels(labels)
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, label_text, bound, cumulative))
+                    lines.append('{}_sum{{{}}} {}'.format(name, label_text, repr(histogram.sum)))
+                    lines.append('{}_count{{{}}} {}'.format(name, label_text, cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    view, method, status = labels
+    return 'view="{}",method="{}",status="{}"'.format(escape_label(view), escape_label(method), escape_label(status))
+
+
+registry = MetricsRegistry()
+
+
+def record_request(request, response, record):
+    resolver_match = getattr(request, 'resolver_match', None)
+    view = resolver_match.url_name if resolver_match is not None and resolver_match.url_name else 'unmatched'
+    duration = time.perf_counter() - record.started
+    registry.observe((view, request.method, str(response.status_code)), {
+        'contactbook_request_duration_seconds': duration,
+        'contactbook_request_db_queries': record.queries,
+        'contactbook_request_db_duration_seconds': record.db_time,
+        'contactbook_request_serialize_duration_seconds': record.serialize_time,
+        'contactbook_request_render_duration_seconds': record.render_time,
+        'contactbook_response_size_bytes': None if response.streaming else len(response.content),
+    })
+    slow_seconds = get_slow_request_seconds()
+    if slow_seconds is not None and duration >= slow_seconds:
+        log_slow_request(request, response, view, duration, record)
+
+
+def log_slow_request(request, response, view, duration, record):
+    max_queries = get_slow_request_max_queries()
+    statements = sorted(record.sql or [], key=lambda statement: statement[1], reverse=True)[:max_queries]
+    logger.warning(
+        'Slow request %s %s (%s) %s in %.3fs: %d queries in %.3fs, serialize %.3fs, render %.3fs%s',
+        request.method, request.get_full_path(), view, response.status_code, duration, record.queries,
+        record.db_time, record.serialize_time, record.render_time,
+        ''.join('\n  %.3fs %s' % (seconds, sql) for sql, seconds in statements))
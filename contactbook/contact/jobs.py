@@ -0,0 +1,92 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from contact import cache, stats
+from contact.models import Contact, ContactBookDeletionJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELETE_CHUNK_SIZE = 10000
+DEFAULT_DELETE_WORKERS = 2
+
+_executor = None
+
+
+def get_delete_chunk_size():
+    return getattr(settings, 'CONTACT_BOOK_DELETE_CHUNK_SIZE', DEFAULT_DELETE_CHUNK_SIZE)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CONTACT_BOOK_DELETE_WORKERS', DEFAULT_DELETE_WORKERS),
+            thread_name_prefix='contact-book-delete')
+    return _executor
+
+
+def soft_delete_contacts_in_chunks(job, chunk_size=None):
+    """
+    Soft deletes the live contacts of the job's contact book, one short transaction per chunk so
+    no statement holds row locks on more than `chunk_size` contacts.
+    """
+    chunk_size = chunk_size or get_delete_chunk_size()
+    contacts = Contact.objects.filter(contact_book_id=job.contact_book_id, deleted=False)
+    while True:
+        ids = list(contacts.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            updated = Contact.objects.filter(id__in=ids, deleted=False).update(
+                deleted=True, deleted_on=job.deleted_on, updated_on=timezone.now())
+            stats.contacts_soft_deleted({job.contact_book_id: updated}, changed_on=job.deleted_on)
+            # contacts read since the request invalidated their book were cached as live
+            cache.invalidate_many(Contact, ids)
+            job.processed += updated
+            job.save(update_fields=['processed', 'updated_on'])
+
+
+def run_contact_book_deletion(job_id):
+    job = ContactBookDeletionJob.objects.get(id=job_id)
+    if job.status == ContactBookDeletionJob.DONE:
+        return job
+    job.status = ContactBookDeletionJob.RUNNING
+    job.save(update_fields=['status', 'updated_on'])
+    try:
+        soft_delete_contacts_in_chunks(job)
+    except Exception as err:
+        logger.exception('Contact book deletion job %s failed', job.id)
+        job.status = ContactBookDeletionJob.FAILED
+        job.error = str(err)
+        job.save(update_fields=['status', 'error', 'updated_on'])
+        return job
+    job.status = ContactBookDeletionJob.DONE
+    job.save(update_fields=['status', 'updated_on'])
+    return job
+
+
+def _run_in_worker(job_id):
+    try:
+        run_contact_book_deletion(job_id)
+    finally:
+        # worker threads own their connections, don't leak one per job
+        connections.close_all()
+
+
+def enqueue_contact_book_deletion(job):
+    """
+    Hands the job to the worker pool once the transaction that created it commits.
+    With CONTACT_BOOK_DELETE_WORKERS = 0 the job runs inline, jobs left pending or running by a
+    stopped process are picked up again by `manage.py resume_contact_book_deletions`.
+    """
+    def submit():
+        if getattr(settings, 'CONTACT_BOOK_DELETE_WORKERS', DEFAULT_DELETE_WORKERS) == 0:
+            run_contact_book_deletion(job.id)
+        else:
+            get_executor().submit(_run_in_worker, job.id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,145 @@
+import json
+import os
+import platform
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from contact.models import ContactBook, Contact
+
+# also the credentials benchmarks/locustfile.py logs in with
+BENCHMARK_USERNAME = os.environ.get('BENCHMARK_USERNAME', 'benchmark')
+BENCHMARK_PASSWORD = os.environ.get('BENCHMARK_PASSWORD', 'benchmark')
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a non empty list.
+    """
+    ordered = sorted(values)
+    rank = max(1, int(round(percent / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def get_benchmark_token():
+    """
+    Token of the benchmark user, created with BENCHMARK_PASSWORD so load tests can log in as well.
+    """
+    user, created = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+    if created or not user.has_usable_password():
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save(update_fields=['password'])
+    token, _ = Token.objects.get_or_create(user=user)
+    return token.key
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the API endpoints in process against the configured database and writes the ' \
+           'timings (p50/p99) and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint')
+        parser.add_argument('--page-size', type=int, default=100, help='page size of the list endpoints')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        contact = Contact.objects.filter(deleted=False).order_by('id').first()
+        if contact is None:
+            raise CommandError('No contacts to benchmark, run generate_contacts first')
+        client = self.get_client()
+        results = {}
+        for name, request in self.get_scenarios(contact, options['page_size']):
+            results[name] = self.measure(client, request, options['iterations'], options['warmup'])
+            self.stdout.write('{:<24} p50 {p50_ms:>9.2f} ms  p99 {p99_ms:>9.2f} ms  queries {queries}'.format(
+                name, **results[name]))
+
+        report = {
+            'meta': {
+                'created_on': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'contacts': Contact.objects.count(),
+                'contact_books': ContactBook.objects.count(),
+                'iterations': options['iterations'],
+                'page_size': options['page_size'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline)['results'], results)
+
+    @staticmethod
+    def get_client():
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(get_benchmark_token()))
+        return client
+
+    @staticmethod
+    def get_scenarios(contact, page_size):
+        contact_book = contact.contact_book
+        counter = iter(range(10 ** 9))
+        return (
+            ('contact_list', lambda client: client.get(reverse('contact_list'), {'page_size': page_size})),
+            ('contact_list_cursor', lambda client: client.get(
+                reverse('contact_list'), {'page_size': page_size, 'pagination': 'cursor'})),
+            ('contact_search', lambda client: client.get(
+                reverse('contact_list'), {'page_size': page_size, 'search': contact.name.split()[0]})),
+            ('contact_filter_email', lambda client: client.get(
+                reverse('contact_list'), {'page_size': page_size, 'email': contact.email.upper()})),
+            ('contact_retrieve', lambda client: client.get(reverse('contact_retrieve', kwargs={'pk': contact.id}))),
+            ('contact_create', lambda client: client.post(reverse('contact_create'), {
+                'name': 'Benchmark', 'email': 'benchmark{}@example.com'.format(next(counter)),
+                'contact_book': contact_book.id}, format='json')),
+            ('contact_book_list', lambda client: client.get(reverse('contact_book_list'), {'page_size': page_size})),
+            ('contact_book_retrieve', lambda client: client.get(
+                reverse('contact_book_retrieve', kwargs={'pk': contact_book.id}))),
+        )
+
+    @staticmethod
+    def measure(client, request, iterations, warmup):
+        timings = []
+        queries = []
+        for iteration in range(warmup + iterations):
+            # every request is rolled back so write benchmarks leave the data set unchanged
+            with transaction.atomic(), CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = request(client)
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError('{} returned {}'.format(response.wsgi_request.path, response.status_code))
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(len(context.captured_queries))
+        return {
+            'p50_ms': percentile(timings, 50),
+            'p99_ms': percentile(timings, 99),
+            'mean_ms': sum(timings) / len(timings),
+            'queries': max(queries),
+        }
+
+    def compare(self, baseline, results):
+        self.stdout.write('')
+        self.stdout.write('{:<24} {:>10} {:>10} {:>8}'.format('endpoint', 'p50 delta', 'p99 delta', 'queries'))
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            self.stdout.write('{:<24} {:>+9.1f}% {:>+9.1f}% {:>+8d}'.format(
+                name,
+                (result['p50_ms'] / before['p50_ms'] - 1) * 100,
+                (result['p99_ms'] / before['p99_ms'] - 1) * 100,
+                result['queries'] - before['queries']))
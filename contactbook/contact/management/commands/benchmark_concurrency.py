@@ -0,0 +1,156 @@
+import http.client
+import json
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from contact.management.commands.benchmark_api import get_benchmark_token, percentile
+from contact.models import Contact
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    wsgiref server handling requests on `threads` threads, a stand-in for one threaded worker process.
+    """
+    request_queue_size = 1024
+
+    def __init__(self, server_address, threads):
+        super().__init__(server_address, QuietRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='benchmark-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def slow_queries(delay):
+    """
+    WSGI middleware making every database query of the request wait `delay` seconds more, like a slow
+    query does: the worker thread is blocked without using the CPU.
+    """
+    def wait(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def middleware(application):
+        def wrapped(environ, start_response):
+            with connection.execute_wrapper(wait):
+                return application(environ, start_response)
+        return wrapped
+    return middleware
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of the read endpoints served by an in-process threaded WSGI server ' \
+           'under many concurrent clients, for each number of worker threads, optionally with slow queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,16', help='comma separated worker thread counts to compare')
+        parser.add_argument('--clients', type=int, default=32, help='concurrent clients')
+        parser.add_argument('--requests', type=int, default=10, help='requests per client')
+        parser.add_argument('--query-delay-ms', type=float, default=50,
+                            help='extra wait added to every database query')
+        parser.add_argument('--page-size', type=int, default=20, help='page size of the list endpoints')
+        parser.add_argument('--output', help='write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        contact = Contact.objects.filter(deleted=False).select_related('contact_book').order_by('id').first()
+        if contact is None:
+            raise CommandError('No contacts to benchmark, run generate_contacts first')
+        token = 'Token {}'.format(get_benchmark_token())
+        paths = [
+            '{}?page_size={}'.format(reverse('contact_list'), options['page_size']),
+            '{}?page_size={}'.format(reverse('contact_book_list'), options['page_size']),
+            reverse('contact_retrieve', kwargs={'pk': contact.id}),
+            reverse('contact_book_retrieve', kwargs={'pk': contact.contact_book_id}),
+        ]
+        application = slow_queries(options['query_delay_ms'] / 1000.0)(get_wsgi_application())
+
+        results = {}
+        for threads in [int(value) for value in options['threads'].split(',')]:
+            results[threads] = self.run(application, threads, paths, token, options['clients'], options['requests'])
+            self.stdout.write('{:>3} threads  {rps:>8.1f} req/s  p50 {p50_ms:>9.2f} ms  p99 {p99_ms:>9.2f} ms  '
+                              'errors {errors}'.format(threads, **results[threads]))
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'created_on': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'clients': options['clients'],
+                    'requests': options['requests'],
+                    'query_delay_ms': options['query_delay_ms'],
+                },
+                'results': {str(threads): result for threads, result in results.items()},
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+    @staticmethod
+    def run(application, threads, paths, token, clients, requests):
+        server = ThreadPoolWSGIServer(('127.0.0.1', 0), threads)
+        server.set_app(application)
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        serving.start()
+        host, port = server.server_address
+        timings, errors = [], []
+
+        def client(offset):
+            for index in range(requests):
+                path = paths[(offset + index) % len(paths)]
+                start = time.perf_counter()
+                try:
+                    conn = http.client.HTTPConnection(host, port, timeout=60)
+                    conn.request('GET', path, headers={'Authorization': token})
+                    response = conn.getresponse()
+                    response.read()
+                    conn.close()
+                    if response.status >= 400:
+                        errors.append(response.status)
+                        continue
+                except (OSError, http.client.HTTPException) as err:
+                    errors.append(repr(err))
+                    continue
+                timings.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        client_threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+        for thread in client_threads:
+            thread.start()
+        for thread in client_threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        server.shutdown()
+        server.server_close()
+        return {
+            'rps': len(timings) / elapsed,
+            'p50_ms': percentile(timings, 50) if timings else None,
+            'p99_ms': percentile(timings, 99) if timings else None,
+            'errors': len(errors),
+        }
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from contact.models import ContactBook, Contact
+
+
+def canonical_queries(contact_book_id, email, name):
+    """
+    The query shapes the API runs most, keyed by a short description.
+    """
+    return (
+        ('contact list page', Contact.objects.select_related(
+            'contact_book', 'created_by', 'changed_by').order_by('-id')[:10]),
+        ('live contacts of a contact book', Contact.objects.filter(
+            contact_book_id=contact_book_id, deleted=False).order_by('-id')[:10]),
+        ('contact email filter (iexact)', Contact.objects.filter(email__iexact=email).order_by('-id')[:10]),
+        ('contact name filter (iexact)', Contact.objects.filter(name__iexact=name).order_by('-id')[:10]),
+        ('contact by (contact_book, email)', Contact.objects.filter(contact_book_id=contact_book_id, email=email)),
+        ('live contact by id', Contact.objects.filter(id=1, deleted=False)),
+        ('contact book list page', ContactBook.objects.select_related(
+            'created_by', 'changed_by').order_by('-id')[:10]),
+        ('contact book name filter (iexact)', ContactBook.objects.filter(name__iexact=name).order_by('-id')[:10]),
+        ('live contact book by id', ContactBook.objects.filter(id=contact_book_id, deleted=False)),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Prints the query plans of the canonical API queries so plan regressions can be spotted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contact-book', type=int, help='contact book id used in the queries, '
+                                                             'defaults to the largest contact book id')
+        parser.add_argument('--email', default='email@domain.com', help='email used in the queries')
+        parser.add_argument('--name', default='name', help='name used in the queries')
+        parser.add_argument('--analyze', action='store_true', help='run EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--format', choices=('text', 'json'), help='plan output format (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        contact_book_id = options['contact_book']
+        if contact_book_id is None:
+            contact_book_id = ContactBook.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        explain_options = {}
+        if connections['default'].vendor == 'postgresql':
+            explain_options['analyze'] = options['analyze']
+            explain_options['format'] = options['format']
+        elif options['analyze'] or options['format']:
+            raise CommandError('--analyze and --format are only supported on PostgreSQL')
+
+        for description, queryset in canonical_queries(contact_book_id, options['email'], options['name']):
+            self.stdout.write(self.style.MIGRATE_HEADING('-- {}'.format(description)))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
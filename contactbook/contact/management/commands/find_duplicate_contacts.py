@@ -0,0 +1,53 @@
+import json
+import textwrap
+
+from django.core.management.base import BaseCommand
+
+from contact.duplicates import find_duplicate_clusters, get_contact_book_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Reports clusters of live contacts sharing a normalized (trimmed, lowercased) email'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contact-book', type=int, action='append', dest='contact_books',
+                            help='only report the duplicates of this contact book and refresh its cached report, '
+                                 'repeatable')
+        parser.add_argument('--partitions', type=int, default=1,
+                            help='passes over the contacts, each keeping 1/partitions of the emails in memory')
+        parser.add_argument('--chunk-size', type=int, help='contacts fetched per query')
+        parser.add_argument('--output', help='write the clusters to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['contact_books']:
+            # books sharing an email report the same cluster
+            clusters = {}
+            for contact_book_id in options['contact_books']:
+                for cluster in get_contact_book_duplicates(contact_book_id, refresh=True)['clusters']:
+                    clusters[cluster['email']] = cluster
+            clusters = sorted(clusters.values(), key=lambda cluster: cluster['email'])
+        else:
+            # written as they are found, only the clusters of the current partition are held in memory
+            clusters = find_duplicate_clusters(partitions=max(1, options['partitions']),
+                                               chunk_size=options['chunk_size'])
+        output = open(options['output'], 'w') if options['output'] else None
+        total_clusters = total_contacts = 0
+        try:
+            if output is not None:
+                output.write('[')
+            for cluster in clusters:
+                if options['verbosity'] > 1:
+                    self.stdout.write('{}: {} contacts in contact books {}'.format(
+                        cluster['email'], len(cluster['contacts']), ', '.join(map(str, cluster['contact_books']))))
+                if output is not None:
+                    # the layout of json.dump(clusters, indent=2), one cluster at a time
+                    output.write(',\n' if total_clusters else '\n')
+                    output.write(textwrap.indent(json.dumps(cluster, indent=2, sort_keys=True), '  '))
+                total_clusters += 1
+                total_contacts += len(cluster['contacts'])
+            if output is not None:
+                output.write('\n]' if total_clusters else ']')
+        finally:
+            if output is not None:
+                output.close()
+        self.stdout.write('{} duplicate clusters, {} contacts'.format(total_clusters, total_contacts))
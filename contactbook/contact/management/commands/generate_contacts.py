@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from contact.bulk import iter_batches
+from contact.management.commands.benchmark_api import BENCHMARK_USERNAME, get_benchmark_token
+from contact.models import ContactBook, Contact
+from contact.stats import rebuild_contact_book_stats
+
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'Mani', 'Priya', 'Arjun', 'Ananya', 'Wei', 'Mei', 'Carlos', 'Lucia', 'Ahmed', 'Fatima')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Kumar', 'Sharma',
+              'Singh', 'Wang', 'Li', 'Zhang', 'Lopez', 'Gonzalez', 'Hassan', 'Ali', 'Martin', 'Wilson')
+
+
+class Command(BaseCommand):
+    help = 'Generates a deterministic set of contact books and contacts for benchmarks, ' \
+           'the same options always produce the same rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100, help='number of contact books')
+        parser.add_argument('--contacts-per-book', type=int, default=1000, help='number of contacts per book')
+        parser.add_argument('--deleted-ratio', type=float, default=0.1, help='share of soft deleted contacts')
+        parser.add_argument('--seed', type=int, default=0, help='random seed')
+        parser.add_argument('--prefix', default='bench', help='contact book name prefix')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        names = ('{}-{}-{:08d}'.format(options['prefix'], options['seed'], index) for index in range(options['books']))
+        total = 0
+        for _, book_names in iter_batches(names, max(1, batch_size // max(1, options['contacts_per_book']))):
+            ContactBook.objects.bulk_create([ContactBook(name=name) for name in book_names], batch_size=batch_size)
+            # bulk_create only returns ids on PostgreSQL
+            contact_book_ids = sorted(ContactBook.objects.filter(name__in=book_names).values_list('id', flat=True))
+            contacts = (
+                self.make_contact(rng, contact_book_id, index, options['deleted_ratio'])
+                for contact_book_id in contact_book_ids for index in range(options['contacts_per_book'])
+            )
+            for _, batch in iter_batches(contacts, batch_size):
+                Contact.objects.bulk_create(batch, batch_size=batch_size)
+                total += len(batch)
+            for contact_book_id in contact_book_ids:
+                rebuild_contact_book_stats(contact_book_id)
+            self.stdout.write('{} contacts created'.format(total))
+        # the user the benchmarks and the locust load test authenticate as
+        get_benchmark_token()
+        self.stdout.write('benchmark user {}'.format(BENCHMARK_USERNAME))
+
+    @staticmethod
+    def make_contact(rng, contact_book_id, index, deleted_ratio):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return Contact(
+            name='{} {}'.format(first_name, last_name),
+            email='{}.{}.{}@book{}.example.com'.format(first_name, last_name, index, contact_book_id).lower(),
+            contact_book_id=contact_book_id,
+            deleted=rng.random() < deleted_ratio,
+        )
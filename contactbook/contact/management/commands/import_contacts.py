@@ -0,0 +1,122 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from contact.bulk import iter_batches
+from contact.file_import import FILE_FORMATS, Checkpoint, describe_source, guess_format, import_batch, \
+    read_contact_file
+from contact.workers import init_django_worker
+
+
+class Command(BaseCommand):
+    help = 'Streams contacts from a csv or newline delimited JSON file into the database in batches, validated ' \
+           'like the import API, written by parallel worker processes and resumable from a checkpoint file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='csv file with name, email and contact_book columns, or ndjson file of '
+                                         'objects with those keys')
+        parser.add_argument('--format', choices=FILE_FORMATS, help='file format, guessed from the extension by default')
+        parser.add_argument('--contact-book', type=int, help='contact book of rows without one')
+        parser.add_argument('--user', help='username recorded as creator of the contacts')
+        parser.add_argument('--batch-size', type=int, default=10000, help='rows per transaction and checkpoint')
+        parser.add_argument('--workers', type=int,
+                            help='worker processes, 0 imports in this process. One per cpu on PostgreSQL and 0 on '
+                                 'other databases by default, which allow at most 1')
+        parser.add_argument('--checkpoint', help='checkpoint file, <path>.checkpoint by default')
+        parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+        parser.add_argument('--errors', help='append rejected rows with their errors to this ndjson file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('{} does not exist'.format(path))
+        file_format = options['format'] or guess_format(path)
+        if file_format not in FILE_FORMATS:
+            raise CommandError('Unknown file format {}, please pass --format'.format(file_format))
+        user_id = None
+        if options['user']:
+            try:
+                user_id = User.objects.get(username=options['user']).id
+            except User.DoesNotExist:
+                raise CommandError('User {} does not exist'.format(options['user']))
+
+        workers = options['workers']
+        if workers is None:
+            workers = os.cpu_count() if connection.vendor == 'postgresql' else 0
+        elif workers > 1 and connection.vendor != 'postgresql':
+            # other databases lock out concurrent writers, parallel batches fail with "database is locked"
+            raise CommandError('{} takes one writer at a time, please pass --workers 0 or 1'.format(
+                connection.vendor))
+
+        batch_size = options['batch_size']
+        checkpoint_path = options['checkpoint'] or '{}.checkpoint'.format(path)
+        if options['restart'] and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        try:
+            self.checkpoint = Checkpoint.load(checkpoint_path, describe_source(path), batch_size)
+        except ValueError as error:
+            raise CommandError('{}, please pass --restart or another --checkpoint'.format(error))
+        self.errors = open(options['errors'], 'a') if options['errors'] else None
+        self.verbosity = options['verbosity']
+
+        batches = (
+            (offset // batch_size, offset, rows)
+            for offset, rows in iter_batches(read_contact_file(path, file_format), batch_size)
+            if not self.checkpoint.is_done(offset // batch_size)
+        )
+        kwargs = {'user_id': user_id, 'default_contact_book': options['contact_book']}
+        try:
+            if workers > 0:
+                self.import_in_processes(batches, kwargs, workers)
+            else:
+                for number, offset, rows in batches:
+                    self.record(import_batch(number, offset, rows, **kwargs))
+        finally:
+            if self.errors is not None:
+                self.errors.close()
+        totals = self.checkpoint.totals
+        self.stdout.write('{created} contacts created, {skipped} already existing, {failed} rows failed'.format(
+            **totals))
+
+    def import_in_processes(self, batches, kwargs, workers):
+        # children are spawned with their own connections, nothing open may leak into them
+        connections.close_all()
+        # children write to the databases this process uses, e.g. a test database
+        databases = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+        pending = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_django_worker, initargs=(databases,)) as pool:
+            for number, offset, rows in batches:
+                # at most two batches per worker are read ahead of the database
+                if len(pending) >= 2 * workers:
+                    self.collect(pending, wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[pool.submit(import_batch, number, offset, rows, **kwargs)] = number
+            self.collect(pending, wait(pending).done)
+
+    def collect(self, pending, done):
+        for future in done:
+            number = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as error:
+                # batches not started yet are dropped, the ones already running finish before the pool closes
+                for other in pending:
+                    other.cancel()
+                raise CommandError('Batch {} failed: {!r}. Finished batches are kept in {}, run the command again '
+                                   'to resume with the failed one'.format(number, error, self.checkpoint.path))
+            self.record(result)
+
+    def record(self, result):
+        self.checkpoint.done(result)
+        if self.errors is not None:
+            for row, errors in result['failed']:
+                self.errors.write(json.dumps({'row': row, 'errors': errors}) + '\n')
+        if self.verbosity > 1:
+            self.stdout.write('batch {batch}: {created} created, {skipped} already existing, {failed} failed'.format(
+                batch=result['batch'], created=result['created'], skipped=result['skipped'],
+                failed=len(result['failed'])))
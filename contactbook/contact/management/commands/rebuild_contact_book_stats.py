@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from contact.models import ContactBook
+from contact.stats import rebuild_contact_book_stats
+
+
+class Command(BaseCommand):
+    help = 'Recounts the stored contact counters of contact books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('contact_book_ids', nargs='*', type=int, help='contact books to rebuild, all by default')
+
+    def handle(self, *args, **options):
+        contact_book_ids = options['contact_book_ids'] or ContactBook.objects.order_by('id').values_list(
+            'id', flat=True).iterator()
+        total = 0
+        for contact_book_id in contact_book_ids:
+            # one transaction per book: counts and stored row agree, locks stay short
+            with transaction.atomic():
+                stats = rebuild_contact_book_stats(contact_book_id)
+            total += 1
+            if options['verbosity'] > 1:
+                self.stdout.write('contact book {}: {} live, {} deleted'.format(
+                    contact_book_id, stats.live_count, stats.deleted_count))
+        self.stdout.write('{} contact books rebuilt'.format(total))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from contact.jobs import run_contact_book_deletion
+from contact.models import ContactBookDeletionJob
+
+
+class Command(BaseCommand):
+    help = 'Runs contact book deletion jobs that are pending, or were interrupted while running'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include-failed', action='store_true', help='Retry failed jobs as well')
+
+    def handle(self, *args, **options):
+        statuses = [ContactBookDeletionJob.PENDING, ContactBookDeletionJob.RUNNING]
+        if options['include_failed']:
+            statuses.append(ContactBookDeletionJob.FAILED)
+        job_ids = list(ContactBookDeletionJob.objects.filter(status__in=statuses).order_by('id').values_list(
+            'id', flat=True))
+        for job_id in job_ids:
+            job = run_contact_book_deletion(job_id)
+            self.stdout.write('job {}: {}, {} contacts deleted'.format(job.id, job.status, job.processed))
@@ -0,0 +1,93 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from contact import instrumentation
+from contact.routers import record_write
+
+
+class InstrumentationMiddleware(object):
+    """
+    Records latency, database queries and time, serialize and render time and response size of every
+    request per url name into `instrumentation.registry`, served by the metrics endpoint. With
+    CONTACT_SLOW_REQUEST_SECONDS set, slower requests are logged with their slowest SQL statements.
+    Placed first so the other middleware are part of the measured time. Streaming responses run their
+    queries while the body is sent and are recorded once it is exhausted or closed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = instrumentation.start_request(capture_sql=instrumentation.get_slow_request_seconds() is not None)
+        streaming = False
+        try:
+            with self.count_queries(record):
+                response = self.get_response(request)
+            if response.streaming:
+                response.streaming_content = self.stream(request, response, response.streaming_content, record)
+                streaming = True
+            else:
+                instrumentation.record_request(request, response, record)
+            return response
+        finally:
+            if not streaming:
+                instrumentation.finish_request()
+
+    @staticmethod
+    def count_queries(record):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record))
+        return stack
+
+    def stream(self, request, response, content, record):
+        """
+        Yields the body of a streaming response, counting the queries run for each chunk.
+        """
+        content = iter(content)
+        try:
+            while True:
+                with self.count_queries(record):
+                    chunk = next(content, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            instrumentation.record_request(request, response, record)
+            # a body closed late must not end the record of a later request of this thread
+            if instrumentation.current_record() is record:
+                instrumentation.finish_request()
+
+    @staticmethod
+    def process_template_response(request, response):
+        # DRF responses are rendered right after this hook, the callback runs once rendering is done
+        record = instrumentation.current_record()
+        if record is not None:
+            record.render_started = time.perf_counter()
+
+            def rendered(response):
+                record.render_time += time.perf_counter() - record.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class ReadYourWritesMiddleware(object):
+    """
+    Records successful unsafe requests of authenticated users, their following reads stay on the
+    primary database for CONTACT_READ_YOUR_WRITES_WINDOW seconds instead of going to a lagging replica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and user is not None \
+                and user.is_authenticated:
+            record_write(user)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 2.1.5 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# Expressions must stay identical to the document built by contact.search.FullTextSearch
+SEARCH_INDEXES = (
+    ('contact_contact_search_idx', 'contact_contact',
+     "gin (to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '')))"),
+    ('contact_contact_name_trgm_idx', 'contact_contact', 'gin (name gin_trgm_ops)'),
+    ('contact_contact_email_trgm_idx', 'contact_contact', 'gin (email gin_trgm_ops)'),
+    ('contact_contactbook_search_idx', 'contact_contactbook', "gin (to_tsvector('simple', coalesce(name, '')))"),
+    ('contact_contactbook_name_trgm_idx', 'contact_contactbook', 'gin (name gin_trgm_ops)'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, definition in SEARCH_INDEXES:
+        schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} USING {}'.format(
+            name, table, definition))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('contact', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
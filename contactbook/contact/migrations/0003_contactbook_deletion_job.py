@@ -0,0 +1,41 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contact', '0002_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactBookDeletionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16)),
+                ('deleted_on', models.DateTimeField()),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='contactbookdeletionjob',
+            name='contact_book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deletion_jobs', to='contact.ContactBook'),
+        ),
+        migrations.AddField(
+            model_name='contactbookdeletionjob',
+            name='created_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='contact_book_deletion_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+# the indexes the field and index operations below describe, built with CREATE INDEX CONCURRENTLY so
+# the contact table stays writable; the field indexes keep the names Django gives them
+INDEXES = (
+    ('contact_contact_email_3b20d0b8', 'contact_contact', '("email")'),
+    ('contact_contact_name_c4a8c117', 'contact_contact', '("name")'),
+    # live contacts of a book by -id, soft deleted rows are left out of the index
+    ('contact_book_live_id_idx', 'contact_contact', '("contact_book_id", "id" DESC) WHERE NOT "deleted"'),
+)
+# prefix lookups of the indexed text columns, PostgreSQL only
+LIKE_INDEXES = (
+    ('contact_contact_email_3b20d0b8_like', 'contact_contact', '("email" varchar_pattern_ops)'),
+    ('contact_contact_name_c4a8c117_like', 'contact_contact', '("name" varchar_pattern_ops)'),
+)
+# PostgreSQL compiles `__iexact` to `UPPER("column"::text) = UPPER(%s)`, these expressions must match it
+UPPER_INDEXES = (
+    ('contact_contact_email_upper_idx', 'contact_contact', '(UPPER(email::text))'),
+    ('contact_contact_name_upper_idx', 'contact_contact', '(UPPER(name::text))'),
+    ('contact_contactbook_name_upper_idx', 'contact_contactbook', '(UPPER(name::text))'),
+)
+
+
+def create_query_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        for name, table, definition in INDEXES:
+            schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON {} {}'.format(name, table, definition))
+        return
+    for name, table, definition in INDEXES + LIKE_INDEXES + UPPER_INDEXES:
+        schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} {}'.format(name, table, definition))
+
+
+def drop_query_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        for name, _, _ in INDEXES:
+            schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+        return
+    for name, _, _ in INDEXES + LIKE_INDEXES + UPPER_INDEXES:
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('contact', '0003_contactbook_deletion_job'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_query_indexes, drop_query_indexes),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='contact',
+                    name='email',
+                    field=models.EmailField(db_index=True, max_length=254),
+                ),
+                migrations.AlterField(
+                    model_name='contact',
+                    name='name',
+                    field=models.CharField(db_index=True, max_length=255),
+                ),
+                # the name is unique, so already indexed
+                migrations.AlterField(
+                    model_name='contactbook',
+                    name='name',
+                    field=models.CharField(db_index=True, max_length=255, unique=True),
+                ),
+                # created as the partial index above, Django 2.1 has no Index(condition=...)
+                migrations.AddIndex(
+                    model_name='contact',
+                    index=models.Index(fields=['contact_book', 'deleted', '-id'], name='contact_book_live_id_idx'),
+                ),
+            ],
+        ),
+    ]
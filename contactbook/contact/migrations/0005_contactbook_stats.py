@@ -0,0 +1,46 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    ContactBook = apps.get_model('contact', 'ContactBook')
+    Contact = apps.get_model('contact', 'Contact')
+    ContactBookStats = apps.get_model('contact', 'ContactBookStats')
+    stats = {
+        contact_book_id: ContactBookStats(contact_book_id=contact_book_id)
+        for contact_book_id in ContactBook.objects.values_list('id', flat=True).iterator()
+    }
+    rows = Contact.objects.order_by().values('contact_book_id', 'deleted').annotate(
+        total=models.Count('id'), last_update=models.Max('updated_on'), last_delete=models.Max('deleted_on'))
+    for row in rows:
+        book_stats = stats[row['contact_book_id']]
+        if row['deleted']:
+            book_stats.deleted_count = row['total']
+        else:
+            book_stats.live_count = row['total']
+        changes = [book_stats.last_contact_change_on, row['last_update'], row['last_delete']]
+        book_stats.last_contact_change_on = max(value for value in changes if value is not None)
+    ContactBookStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactBookStats',
+            fields=[
+                ('contact_book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='contact.ContactBook')),
+                ('live_count', models.IntegerField(default=0)),
+                ('deleted_count', models.IntegerField(default=0)),
+                ('last_contact_change_on', models.DateTimeField(blank=True, null=True)),
+                ('rebuilt_on', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+SYNC_INDEX_NAME = 'contact_book_sync_idx'
+SYNC_INDEX_DEFINITION = '("contact_book_id", "updated_on", "id")'
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_deleted_updated_on(apps, schema_editor):
+    # contact book soft deletes used to leave updated_on behind deleted_on, the sync feed only reads updated_on;
+    # one short transaction per id range, contact writes are never blocked for the whole table
+    Contact = apps.get_model('contact', 'Contact')
+    contacts = Contact.objects.using(schema_editor.connection.alias)
+    last_id = contacts.aggregate(last_id=models.Max('id'))['last_id'] or 0
+    for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+        contacts.filter(id__gt=start, id__lte=start + BACKFILL_BATCH_SIZE,
+                        deleted_on__gt=models.F('updated_on')).update(updated_on=models.F('deleted_on'))
+
+
+def create_sync_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute('CREATE INDEX {}IF NOT EXISTS {} ON contact_contact {}'.format(
+        concurrently, SYNC_INDEX_NAME, SYNC_INDEX_DEFINITION))
+
+
+def drop_sync_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute('DROP INDEX {}IF EXISTS {}'.format(concurrently, SYNC_INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, every backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('contact', '0005_contactbook_stats'),
+    ]
+
+    operations = [
+        # before the index exists, the backfill does not have to maintain it
+        migrations.RunPython(backfill_deleted_updated_on, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_sync_index, drop_sync_index),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='contact',
+                    index=models.Index(fields=['contact_book', 'updated_on', 'id'], name='contact_book_sync_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.5 on 2026-10-18 19:05
+
+from django.db import migrations
+
+# must match the SQL of contact.duplicates.normalized_email(): LOWER(TRIM("contact_contact"."email"))
+INDEX_NAME = 'contact_contact_email_normalized_idx'
+INDEX_DEFINITION = '(LOWER(TRIM(email)))'
+
+
+def create_normalized_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON contact_contact {}'.format(
+        INDEX_NAME, INDEX_DEFINITION))
+
+
+def drop_normalized_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('contact', '0006_contact_sync_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_normalized_email_index, drop_normalized_email_index),
+    ]
@@ -36,6 +36,63 @@ class Contact(models.Model):
         ordering = ('-id',)
         # considering same email in two or more contactbook but unique within contact book
         unique_together = ('contact_book', 'email')
+        indexes = [
+            # live contacts of a book ordered by -id (export, deletion jobs), created by migration 0004 as a
+            # partial (contact_book, -id) index over live rows
+            models.Index(fields=['contact_book', 'deleted', '-id'], name='contact_book_live_id_idx'),
+            # contacts of a book in (updated_on, id) order, pages of the incremental sync feed
+            models.Index(fields=['contact_book', 'updated_on', 'id'], name='contact_book_sync_idx'),
+        ]
 
     def __str__(self):
         return self.email
+
+
+class ContactBookDeletionJob(models.Model):
+    """
+    Background soft delete of the contacts of a contact book, processed in chunks by contact.jobs
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    contact_book = models.ForeignKey(to=ContactBook, on_delete=models.CASCADE, related_name='deletion_jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    # every chunk writes this timestamp, it is the one stored on the contact book
+    deleted_on = models.DateTimeField()
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(User, null=True, related_name='contact_book_deletion_jobs', on_delete=models.CASCADE)
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-id',)
+
+    def __str__(self):
+        return '{} ({})'.format(self.contact_book_id, self.status)
+
+
+class ContactBookStats(models.Model):
+    """
+    Denormalized contact counters of a contact book, changed by contact.stats in the transaction
+    that changes the contacts and rebuilt by `manage.py rebuild_contact_book_stats`
+    """
+    contact_book = models.OneToOneField(to=ContactBook, on_delete=models.CASCADE, primary_key=True,
+                                        related_name='stats')
+    live_count = models.IntegerField(default=0)
+    deleted_count = models.IntegerField(default=0)
+    # last create, update or delete of a contact of the book
+    last_contact_change_on = models.DateTimeField(null=True, blank=True)
+    rebuilt_on = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{}: {} live, {} deleted'.format(self.contact_book_id, self.live_count, self.deleted_count)
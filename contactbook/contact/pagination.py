@@ -1,8 +1,110 @@
+import hashlib
+import json
 from collections import OrderedDict
 
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
 
+from contact.cache import get_cache
+
+COUNT_EXACT = 'exact'
+COUNT_CACHED = 'cached'
+COUNT_ESTIMATE = 'estimate'
+DEFAULT_COUNT_STRATEGY = COUNT_EXACT
+DEFAULT_COUNT_CACHE_TIMEOUT = 60
+DEFAULT_COUNT_ESTIMATE_THRESHOLD = 100000
+
+
+def get_count_strategy():
+    return getattr(settings, 'CONTACT_LIST_COUNT_STRATEGY', DEFAULT_COUNT_STRATEGY)
+
+
+def get_count_cache_timeout():
+    return getattr(settings, 'CONTACT_LIST_COUNT_CACHE_TIMEOUT', DEFAULT_COUNT_CACHE_TIMEOUT)
+
+
+def get_count_estimate_threshold():
+    return getattr(settings, 'CONTACT_LIST_COUNT_ESTIMATE_THRESHOLD', DEFAULT_COUNT_ESTIMATE_THRESHOLD)
+
+
+def make_count_key(queryset):
+    """
+    Cache key of the count of `queryset`: the filtered SQL and its parameters, ordering and
+    selected columns do not change the count and are left out.
+    """
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    signature = '{}|{}|{}'.format(queryset.db, sql, params)
+    return 'contactbook:count:{}'.format(hashlib.sha256(signature.encode()).hexdigest())
+
+
+def cached_count(queryset):
+    cache = get_cache()
+    key = make_count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=get_count_cache_timeout())
+    return count
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate on PostgreSQL: `pg_class.reltuples` for an unfiltered table, the EXPLAIN
+    row estimate otherwise. None on other databases.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            return cursor.fetchone()[0]
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    # psycopg2 decodes json columns, other drivers hand back text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def count_queryset(queryset, strategy=None):
+    """
+    Count of `queryset` by `strategy` (CONTACT_LIST_COUNT_STRATEGY by default), returned with the
+    strategy actually used: estimates below CONTACT_LIST_COUNT_ESTIMATE_THRESHOLD, or where the
+    database cannot estimate, are counted exactly.
+    """
+    strategy = strategy or get_count_strategy()
+    if strategy == COUNT_ESTIMATE:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate >= get_count_estimate_threshold():
+            return estimate, COUNT_ESTIMATE
+        return queryset.count(), COUNT_EXACT
+    if strategy == COUNT_CACHED:
+        return cached_count(queryset), COUNT_CACHED
+    return queryset.count(), COUNT_EXACT
+
+
+class StrategyCountPaginator(Paginator):
+    """
+    Paginator whose count comes from `count_queryset`, `count_strategy` says how it was obtained.
+    `known_count` is a (count, strategy) pair the caller already got from `count_queryset`.
+    """
+    count_strategy = None
+
+    def __init__(self, object_list, per_page, known_count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = known_count
+
+    @cached_property
+    def count(self):
+        count, self.count_strategy = self.known_count or count_queryset(self.object_list)
+        return count
+
 
 class LargeResultsSetPagination(PageNumberPagination):
     page_size = 1000
@@ -11,17 +113,82 @@ class LargeResultsSetPagination(PageNumberPagination):
 
 
 class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Page number pagination, the total count is exact, cached or estimated as configured by
+    CONTACT_LIST_COUNT_STRATEGY and `count_strategy` in the response says which one was used.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 1000
+    known_count = None
+
+    def django_paginator_class(self, object_list, per_page):
+        return StrategyCountPaginator(object_list, per_page, known_count=self.known_count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # the count a view already has, e.g. from its list validators, is not queried again
+        self.known_count = getattr(view, 'known_count', None)
+        return super().paginate_queryset(queryset, request, view=view)
 
     def get_paginated_response(self, data):
         return Response(OrderedDict({
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'count': self.page.paginator.count,
+            'count_strategy': self.page.paginator.count_strategy,
+            'msg': data["msg"],
+            'status': data["status"],
+            'status_code': data["status_code"],
+            'data': data["data"],
+        }))
+
+
+class StandardResultsSetCursorPagination(CursorPagination):
+    """
+    Keyset pagination on '-id': every page is a `WHERE id < <cursor>` index range scan, so
+    latency does not grow with depth. The total count is only computed when asked for
+    with `?count=true`, otherwise it is returned as null.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': self.count,
+            'count_strategy': COUNT_EXACT if self.count is not None else None,
             'msg': data["msg"],
             'status': data["status"],
             'status_code': data["status_code"],
             'data': data["data"],
         }))
+
+
+class PaginationModeMixin(object):
+    """
+    Lets list views switch paginator per request with `?pagination=cursor`,
+    page number pagination stays the default.
+    """
+    pagination_mode_query_param = 'pagination'
+    pagination_modes = {
+        'page': StandardResultsSetPagination,
+        'cursor': StandardResultsSetCursorPagination,
+    }
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            mode = self.request.query_params.get(self.pagination_mode_query_param)
+            pagination_class = self.pagination_modes.get(mode, self.pagination_class)
+            self._paginator = pagination_class() if pagination_class is not None else None
+        return self._paginator
@@ -0,0 +1,98 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from contact import cache
+
+DEFAULT_READ_YOUR_WRITES_WINDOW = 5
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'CONTACT_DATABASE_REPLICAS', [])
+
+
+def get_read_your_writes_window():
+    return getattr(settings, 'CONTACT_READ_YOUR_WRITES_WINDOW', DEFAULT_READ_YOUR_WRITES_WINDOW)
+
+
+def make_recent_write_key(user_id):
+    return 'contactbook:recent-write:{}'.format(user_id)
+
+
+def record_write(user):
+    """
+    Keeps the reads of `user` on the primary for CONTACT_READ_YOUR_WRITES_WINDOW seconds, in every
+    worker sharing the cache.
+    """
+    window = get_read_your_writes_window()
+    if window and get_replicas():
+        cache.get_cache().set(make_recent_write_key(user.pk), 1, timeout=window)
+
+
+def wrote_recently(user):
+    return cache.get_cache().get(make_recent_write_key(user.pk)) is not None
+
+
+def read_from_replica(alias=None):
+    """
+    Routes the reads of the current thread to `alias`, a random replica by default.
+    """
+    replicas = get_replicas()
+    _state.replica = alias or (random.choice(replicas) if replicas else None)
+
+
+def read_from_primary():
+    _state.replica = None
+
+
+def current_replica():
+    return getattr(_state, 'replica', None)
+
+
+class ReplicaRouter(object):
+    """
+    Sends reads to the replica picked for the current request by `ReplicaReadMixin`, everything else,
+    including all writes, goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+
+class ReplicaReadMixin(object):
+    """
+    Serves safe requests of `replica_actions` (every safe request of views without actions) from a
+    replica once the user is authenticated, unless the user wrote within the read-your-writes window.
+    Authentication itself reads from the primary so fresh tokens are found.
+    """
+    replica_actions = None
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS or not get_replicas():
+            return False
+        if self.replica_actions is not None and getattr(self, 'action', None) not in self.replica_actions:
+            return False
+        return not (request.user.is_authenticated and wrote_recently(request.user))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            read_from_replica()
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_from_primary()
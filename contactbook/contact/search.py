@@ -1,5 +1,69 @@
+from django.db import connections
 from rest_framework import filters
 
+TEXT_FIELD_TYPES = ('CharField', 'TextField')
+
 
 class CustomSearch(filters.SearchFilter):
     search_param = "search"
+
+
+class FullTextSearch(CustomSearch):
+    """
+    PostgreSQL search over the text fields of `view.search_fields`: a row matches when its
+    `to_tsvector('simple', ...)` document matches the terms, or a field contains the search string
+    (ILIKE) or is trigram-similar to it. Every predicate is served by the GIN indexes created in
+    migration 0002_search_indexes. Results are ranked by ts_rank plus the best trigram similarity
+    unless the client asks for an explicit `ordering`.
+    On other databases it falls back to the CustomSearch icontains behaviour.
+    """
+    text_search_config = 'simple'
+    ordering_param = 'ordering'
+
+    def get_text_fields(self, queryset, search_fields):
+        opts = queryset.model._meta
+        return [
+            field_name for field_name in search_fields
+            if opts.get_field(field_name).get_internal_type() in TEXT_FIELD_TYPES
+        ]
+
+    @staticmethod
+    def escape_like(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = getattr(view, 'search_fields', None)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms or connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        quote_name = connections[queryset.db].ops.quote_name
+        table = quote_name(queryset.model._meta.db_table)
+        columns = ['{}.{}'.format(table, quote_name(field_name))
+                   for field_name in self.get_text_fields(queryset, search_fields)]
+        if not columns:
+            return super().filter_queryset(request, queryset, view)
+        search = ' '.join(search_terms)
+        # must stay identical to the expression indexed in migration 0002_search_indexes
+        document = "to_tsvector('{}', {})".format(
+            self.text_search_config, " || ' ' || ".join("coalesce({}, '')".format(column) for column in columns))
+        ts_query = "plainto_tsquery('{}', %s)".format(self.text_search_config)
+
+        predicates = ['{} @@ {}'.format(document, ts_query)]
+        params = [search]
+        for column in columns:
+            predicates.append('{} ILIKE %s'.format(column))
+            predicates.append('{} %% %s'.format(column))
+            params.extend(['%{}%'.format(self.escape_like(search)), search])
+        if search.isdigit() and 'id' in search_fields:
+            predicates.append('{}.{} = %s'.format(table, quote_name('id')))
+            params.append(int(search))
+        queryset = queryset.extra(where=['({})'.format(' OR '.join(predicates))], params=params)
+
+        if request.query_params.get(self.ordering_param):
+            return queryset
+        similarity = ', '.join('similarity({}, %s)'.format(column) for column in columns)
+        rank = 'ts_rank({}, {}) + greatest({})'.format(document, ts_query, similarity)
+        return queryset.extra(
+            select={'search_rank': rank}, select_params=[search] + [search] * len(columns)
+        ).order_by('-search_rank', '-id')
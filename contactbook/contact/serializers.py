@@ -1,30 +1,116 @@
 from django.contrib.auth.models import User
+from django.db import models
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
-from contact.models import ContactBook, Contact
+from contact.filters import ContactFilter
+from contact.models import ContactBook, Contact, ContactBookDeletionJob
 
 
-class ContactBookSerializer(serializers.Serializer):
+class LoadedRelatedFieldMixin(object):
+    """
+    Resolves the submitted key without a query when it is the one of the related object already
+    loaded on the instance being updated or of the requesting user (`request` in the context).
+    """
+
+    def to_internal_value(self, data):
+        for candidate in self.get_loaded_objects():
+            if self.matches(candidate, data):
+                return candidate
+        return super().to_internal_value(data)
+
+    def get_loaded_objects(self):
+        model = self.get_queryset().model
+        instance = getattr(self.parent, 'instance', None)
+        if isinstance(instance, models.Model):
+            field = instance._meta.get_field(self.source)
+            if field.is_cached(instance) and isinstance(getattr(instance, self.source), model):
+                yield getattr(instance, self.source)
+        user = getattr(self.context.get('request'), 'user', None)
+        if isinstance(user, model):
+            yield user
+
+    def matches(self, candidate, data):
+        raise NotImplementedError
+
+
+class LoadedSlugRelatedField(LoadedRelatedFieldMixin, serializers.SlugRelatedField):
+
+    def matches(self, candidate, data):
+        return getattr(candidate, self.slug_field) == data
+
+
+class LoadedPrimaryKeyRelatedField(LoadedRelatedFieldMixin, serializers.PrimaryKeyRelatedField):
+
+    def matches(self, candidate, data):
+        return isinstance(data, (int, str)) and not isinstance(data, bool) and str(candidate.pk) == str(data)
+
+
+class DatabaseUniqueMixin(object):
+    """
+    Uniqueness is enforced by the database constraints instead of a query per validator before
+    every write. The validators of `get_unique_validators` only run after a write failed with an
+    IntegrityError, once its transaction is rolled back, to report the violation like validation would.
+    """
+
+    def get_unique_validators(self):
+        """
+        :return: (field name, or None for validators of the whole data, validator) pairs
+        """
+        return ()
+
+    def get_unique_errors(self):
+        errors = {}
+        for field_name, validator in self.get_unique_validators():
+            if field_name is None:
+                validator.set_context(self)
+                value = self.validated_data
+            elif field_name in self.validated_data:
+                validator.set_context(self.fields[field_name])
+                value = self.validated_data[field_name]
+            else:
+                continue
+            try:
+                validator(value)
+            except serializers.ValidationError as error:
+                errors.setdefault(field_name or api_settings.NON_FIELD_ERRORS_KEY, []).extend(error.detail)
+        return errors
+
+
+def save_changes(instance, validated_data):
+    """
+    Applies the changes to the (locked) instance and writes them with one UPDATE of the changed
+    columns, auto_now keeps updated_on, the ETag/Last-Modified source, current.
+    """
+    for name, value in validated_data.items():
+        setattr(instance, name, value)
+    instance.save(update_fields=list(validated_data) + ['updated_on'])
+    return instance
+
+
+class ContactBookSerializer(DatabaseUniqueMixin, serializers.Serializer):
     id = serializers.IntegerField(label='ID', read_only=True)
-    name = serializers.CharField(max_length=255, validators=[UniqueValidator(queryset=ContactBook.objects.all())])
+    name = serializers.CharField(max_length=255)
     created_on = serializers.DateTimeField(read_only=True)
     updated_on = serializers.DateTimeField(read_only=True)
     deleted = serializers.BooleanField(required=False)
     deleted_on = serializers.DateTimeField(allow_null=True, required=False)
-    created_by = serializers.SlugRelatedField(queryset=User.objects.all(), required=False, slug_field="username")
-    changed_by = serializers.SlugRelatedField(queryset=User.objects.all(), slug_field="username")
+    created_by = LoadedSlugRelatedField(queryset=User.objects.all(), required=False, slug_field="username")
+    changed_by = LoadedSlugRelatedField(queryset=User.objects.all(), slug_field="username")
+
+    def get_unique_validators(self):
+        return (('name', UniqueValidator(queryset=ContactBook.objects.all())),)
 
     def create(self, validated_data):
         instance = ContactBook.objects.create(**validated_data)
         return instance
 
     def update(self, instance, validated_data):
-        ContactBook.objects.filter(id=instance.id).update(**validated_data)
-        return ContactBook.objects.get(id=instance.id)
+        return save_changes(instance, validated_data)
 
 
-class ContactSerializer(serializers.Serializer):
+class ContactSerializer(DatabaseUniqueMixin, serializers.Serializer):
     id = serializers.IntegerField(label='ID', read_only=True)
     name = serializers.CharField(max_length=255)
     email = serializers.EmailField(max_length=254, required=True)
@@ -32,10 +118,9 @@ class ContactSerializer(serializers.Serializer):
     updated_on = serializers.DateTimeField(read_only=True)
     deleted = serializers.BooleanField(required=False)
     deleted_on = serializers.DateTimeField(allow_null=True, required=False)
-    contact_book = serializers.PrimaryKeyRelatedField(write_only=True, queryset=ContactBook.objects.all(),
-                                                      required=True)
-    created_by = serializers.SlugRelatedField(queryset=User.objects.all(), required=False, slug_field="username")
-    changed_by = serializers.SlugRelatedField(queryset=User.objects.all(), slug_field="username")
+    contact_book = LoadedPrimaryKeyRelatedField(write_only=True, queryset=ContactBook.objects.all(), required=True)
+    created_by = LoadedSlugRelatedField(queryset=User.objects.all(), required=False, slug_field="username")
+    changed_by = LoadedSlugRelatedField(queryset=User.objects.all(), slug_field="username")
 
     contact_book_name = serializers.SerializerMethodField()
 
@@ -45,13 +130,145 @@ class ContactSerializer(serializers.Serializer):
             return instance.contact_book.name
         return None
 
-    class Meta:
-        validators = [UniqueTogetherValidator(queryset=Contact.objects.all(), fields=('contact_book', 'email'))]
+    def get_unique_validators(self):
+        return ((None, UniqueTogetherValidator(queryset=Contact.objects.all(), fields=('contact_book', 'email'))),)
 
     def create(self, validated_data):
         instance = Contact.objects.create(**validated_data)
         return instance
 
     def update(self, instance, validated_data):
-        Contact.objects.filter(id=instance.id).update(**validated_data)
-        return Contact.objects.get(id=instance.id)
+        return save_changes(instance, validated_data)
+
+
+class ContactImportSerializer(serializers.Serializer):
+    """
+    Row level validation for bulk imports, relations and uniqueness are resolved per batch by
+    `contact.bulk.ContactImporter` instead of one query per row.
+    """
+    name = serializers.CharField(max_length=255)
+    email = serializers.EmailField(max_length=254, required=True)
+    contact_book = serializers.IntegerField(required=True)
+
+
+class ContactBookDeletionJobSerializer(serializers.Serializer):
+    id = serializers.IntegerField(label='ID', read_only=True)
+    contact_book = serializers.PrimaryKeyRelatedField(read_only=True)
+    status = serializers.ChoiceField(choices=ContactBookDeletionJob.STATUS_CHOICES, read_only=True)
+    deleted_on = serializers.DateTimeField(read_only=True)
+    processed = serializers.IntegerField(read_only=True)
+    error = serializers.CharField(read_only=True)
+    created_on = serializers.DateTimeField(read_only=True)
+    updated_on = serializers.DateTimeField(read_only=True)
+
+
+class ContactBookStatsSerializer(serializers.Serializer):
+    contact_book = serializers.PrimaryKeyRelatedField(read_only=True)
+    live_count = serializers.IntegerField(read_only=True)
+    deleted_count = serializers.IntegerField(read_only=True)
+    last_contact_change_on = serializers.DateTimeField(read_only=True)
+    rebuilt_on = serializers.DateTimeField(read_only=True)
+
+
+class ContactKeySerializer(serializers.Serializer):
+    contact_book = serializers.IntegerField()
+    email = serializers.EmailField(max_length=254)
+
+
+class ContactBulkRetrieveSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    keys = serializers.ListField(child=ContactKeySerializer(), required=False)
+
+    def validate(self, attrs):
+        max_keys = self.context.get('max_keys')
+        if bool(attrs.get('ids')) == bool(attrs.get('keys')):
+            raise serializers.ValidationError('Please specify either ids or keys')
+        if max_keys is not None and len(attrs.get('ids') or attrs.get('keys')) > max_keys:
+            raise serializers.ValidationError('At most {} contacts can be fetched per request'.format(max_keys))
+        return attrs
+
+
+class ContactSelectionSerializer(serializers.Serializer):
+    """
+    Selects live contacts either by `ids` or by a `filter` with the ContactFilter fields,
+    the resulting queryset is returned as validated_data['queryset'].
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    filter = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        if bool(attrs.get('ids')) == bool(attrs.get('filter')):
+            raise serializers.ValidationError('Please specify either ids or filter')
+        queryset = Contact.objects.filter(deleted=False)
+        if attrs.get('ids'):
+            attrs['queryset'] = queryset.filter(id__in=attrs['ids'])
+            return attrs
+        filterset = ContactFilter(data=attrs['filter'], queryset=queryset)
+        unknown = set(attrs['filter']) - set(filterset.filters)
+        if unknown:
+            raise serializers.ValidationError({'filter': ['Unknown filter {}'.format(', '.join(sorted(unknown)))]})
+        if not filterset.is_valid():
+            raise serializers.ValidationError({'filter': filterset.errors})
+        attrs['queryset'] = filterset.qs
+        return attrs
+
+
+class ContactBulkChangesSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255, required=False)
+    contact_book = serializers.PrimaryKeyRelatedField(queryset=ContactBook.objects.all(), required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('Please specify the fields to update')
+        return attrs
+
+
+class ContactBulkUpdateSerializer(ContactSelectionSerializer):
+    data = ContactBulkChangesSerializer()
+
+
+class ValuesRowSerializer(object):
+    """
+    Read-only serializer for `.values()` rows producing the same output as `serializer_class(many=True).data`.
+    The field to lookup/conversion mapping is compiled once, conversions only run where DRF would
+    transform the database value (datetimes). SerializerMethodFields need a lookup in `method_lookups`.
+    """
+    passthrough_fields = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+    def __init__(self, serializer_class, method_lookups=None):
+        method_lookups = method_lookups or {}
+        self.fields = []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                lookup, convert = method_lookups[field.field_name], None
+            elif isinstance(field, serializers.SlugRelatedField):
+                lookup, convert = '{}__{}'.format(field.source, field.slug_field), None
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                lookup, convert = '{}_id'.format(field.source), None
+            elif isinstance(field, self.passthrough_fields):
+                lookup, convert = field.source, None
+            else:
+                lookup, convert = field.source, field.to_representation
+            self.fields.append((field.field_name, lookup, convert))
+        self.lookups = [lookup for _, lookup, _ in self.fields]
+
+    def values(self, queryset):
+        # keep extra selects (e.g. the search rank) so ordering on them still works
+        return queryset.values(*(self.lookups + list(queryset.query.extra)))
+
+    def to_representation(self, rows):
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in fields:
+                value = row[lookup]
+                item[name] = convert(value) if convert is not None and value is not None else value
+            data.append(item)
+        return data
+
+
+contact_rows = ValuesRowSerializer(ContactSerializer, method_lookups={'contact_book_name': 'contact_book__name'})
+contact_book_rows = ValuesRowSerializer(ContactBookSerializer)
@@ -0,0 +1,111 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from contact.models import Contact, ContactBookStats
+
+
+def count_by_contact_book(ids, chunk_size=1000):
+    """
+    :return: Counter of contact_book_id -> number of contacts among `ids`
+    """
+    counts = Counter()
+    for start in range(0, len(ids), chunk_size):
+        rows = Contact.objects.filter(id__in=ids[start:start + chunk_size]).order_by().values(
+            'contact_book_id').annotate(total=Count('id')).values_list('contact_book_id', 'total')
+        counts.update(dict(rows))
+    return counts
+
+
+def rebuild_contact_book_stats(contact_book_id):
+    """
+    Recounts the contacts of a contact book and stores the result.
+    """
+    totals = Contact.objects.filter(contact_book_id=contact_book_id).order_by().values('deleted').annotate(
+        total=Count('id')).values_list('deleted', 'total')
+    totals = dict(totals)
+    last_change = Contact.objects.filter(contact_book_id=contact_book_id).aggregate(
+        updated_on=Max('updated_on'), deleted_on=Max('deleted_on'))
+    changes = [value for value in last_change.values() if value is not None]
+    stats, _ = ContactBookStats.objects.update_or_create(contact_book_id=contact_book_id, defaults={
+        'live_count': totals.get(False, 0),
+        'deleted_count': totals.get(True, 0),
+        'last_contact_change_on': max(changes) if changes else None,
+        'rebuilt_on': timezone.now(),
+    })
+    return stats
+
+
+def get_contact_book_stats(contact_book_id):
+    """
+    Stored counters of a contact book, built on first use for books that have none yet.
+    """
+    try:
+        return ContactBookStats.objects.get(contact_book_id=contact_book_id)
+    except ContactBookStats.DoesNotExist:
+        return rebuild_contact_book_stats(contact_book_id)
+
+
+def change_stats(contact_book_id, live=0, deleted=0, changed_on=None):
+    """
+    Adds `live` and `deleted` to the counters of a contact book with an UPDATE ... SET x = x + n, so
+    concurrent writers don't lose increments. Has to run in the transaction changing the contacts.
+    A missing stats row is built by counting, which already includes the current change.
+    """
+    changed_on = changed_on or timezone.now()
+    updated = ContactBookStats.objects.filter(contact_book_id=contact_book_id).update(
+        live_count=F('live_count') + live, deleted_count=F('deleted_count') + deleted,
+        last_contact_change_on=changed_on)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            rebuild_contact_book_stats(contact_book_id)
+    except IntegrityError:
+        # created concurrently, that row does not include this change yet
+        change_stats(contact_book_id, live=live, deleted=deleted, changed_on=changed_on)
+
+
+def contacts_touched(counts, changed_on=None):
+    for contact_book_id in counts:
+        change_stats(contact_book_id, changed_on=changed_on)
+
+
+def contact_changed(before=None, after=None, changed_on=None):
+    """
+    Moves one contact between counters, `before` and `after` are its (contact_book_id, deleted)
+    state, None when the contact does not exist (create, hard delete).
+    """
+    # one change per book: a rebuilt row already includes the whole change
+    deltas = {}
+    for state, step in ((before, -1), (after, 1)):
+        if state is not None:
+            delta = deltas.setdefault(state[0], {'live': 0, 'deleted': 0})
+            delta['deleted' if state[1] else 'live'] += step
+    for contact_book_id, delta in deltas.items():
+        change_stats(contact_book_id, changed_on=changed_on, **delta)
+
+
+def contacts_created(counts, changed_on=None):
+    for contact_book_id, total in counts.items():
+        change_stats(contact_book_id, live=total, changed_on=changed_on)
+
+
+def contacts_soft_deleted(counts, changed_on=None):
+    for contact_book_id, total in counts.items():
+        change_stats(contact_book_id, live=-total, deleted=total, changed_on=changed_on)
+
+
+def contacts_moved(counts, contact_book_id, changed_on=None):
+    """
+    Live contacts, counted per source book in `counts`, moved to `contact_book_id`.
+    """
+    moved = 0
+    for source_id, total in counts.items():
+        if source_id != contact_book_id:
+            change_stats(source_id, live=-total, changed_on=changed_on)
+            moved += total
+    change_stats(contact_book_id, live=moved, changed_on=changed_on)
+
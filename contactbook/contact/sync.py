@@ -0,0 +1,117 @@
+import base64
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from contact.models import Contact
+from contact.serializers import contact_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_PAGE_SIZE = 500
+DEFAULT_SYNC_MAX_PAGE_SIZE = 5000
+DEFAULT_SYNC_SETTLE_SECONDS = 5
+DEFAULT_SYNC_MAX_TRANSACTION_SECONDS = 300
+CURSOR_CONDITION = '("{0}"."updated_on", "{0}"."id") > (%s, %s)'
+# start of the oldest transaction of any other client session, its writes can still commit older
+# timestamps; autovacuum and other background workers never write contacts
+OLDEST_TRANSACTION_SQL = (
+    'SELECT MIN(xact_start) FROM pg_stat_activity '
+    "WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL "
+    "AND backend_type = 'client backend'"
+)
+
+
+def get_sync_page_size():
+    return getattr(settings, 'CONTACT_SYNC_PAGE_SIZE', DEFAULT_SYNC_PAGE_SIZE)
+
+
+def get_sync_max_page_size():
+    return getattr(settings, 'CONTACT_SYNC_MAX_PAGE_SIZE', DEFAULT_SYNC_MAX_PAGE_SIZE)
+
+
+def get_sync_settle_seconds():
+    return getattr(settings, 'CONTACT_SYNC_SETTLE_SECONDS', DEFAULT_SYNC_SETTLE_SECONDS)
+
+
+def get_sync_max_transaction_seconds():
+    return getattr(settings, 'CONTACT_SYNC_MAX_TRANSACTION_SECONDS', DEFAULT_SYNC_MAX_TRANSACTION_SECONDS)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(updated_on, pk):
+    return base64.urlsafe_b64encode('{}|{}'.format(updated_on.isoformat(), pk).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    :return: (updated_on, id) of the last contact the client has seen
+    """
+    try:
+        updated_on, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        updated_on, pk = parse_datetime(updated_on), int(pk)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(cursor)
+    if updated_on is None or timezone.is_naive(updated_on):
+        raise InvalidCursor(cursor)
+    return updated_on, pk
+
+
+def get_horizon(using):
+    """
+    Latest updated_on a page may include: CONTACT_SYNC_SETTLE_SECONDS before now, or on PostgreSQL
+    before the start of the oldest open transaction if that is earlier. Transactions open for more
+    than CONTACT_SYNC_MAX_TRANSACTION_SECONDS (e.g. a session left idle in transaction) are logged and
+    no longer hold the feed back.
+    """
+    horizon = timezone.now()
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(OLDEST_TRANSACTION_SQL)
+            oldest = db_cursor.fetchone()[0]
+        if oldest is not None:
+            limit = horizon - timedelta(seconds=get_sync_max_transaction_seconds())
+            if oldest < limit:
+                logger.warning('A transaction open since %s is older than CONTACT_SYNC_MAX_TRANSACTION_SECONDS, '
+                               'sync pages no longer wait for it', oldest.isoformat())
+                oldest = limit
+            horizon = min(horizon, oldest)
+    return horizon - timedelta(seconds=get_sync_settle_seconds())
+
+
+def changed_contacts(contact_book_id, cursor=None, page_size=None):
+    """
+    Contacts of a book changed after `cursor`, soft deleted ones included as tombstones, in
+    (updated_on, id) order so a page is an index range scan of contact_book_sync_idx.
+
+    Soft deletes set updated_on as well, so updated_on alone covers deleted_on. Rows changed after
+    `get_horizon` are held back: transactions that are still open can commit rows with timestamps
+    behind them, a cursor past those rows would skip them for good. Other databases than
+    PostgreSQL rely on writes committing within CONTACT_SYNC_SETTLE_SECONDS of their timestamps.
+    The feed has to read from the primary, a lagging replica would be the same as late commits.
+    :return: (rows, cursor of the last row or the given cursor, whether more rows are ready)
+    """
+    page_size = page_size or get_sync_page_size()
+    queryset = Contact.objects.filter(contact_book_id=contact_book_id)
+    queryset = queryset.filter(updated_on__lte=get_horizon(queryset.db))
+    if cursor:
+        updated_on, pk = decode_cursor(cursor)
+        # a row value comparison is one index range condition, an OR of the two cases is not; raw
+        # params skip the field's conversion, so the datetime is adapted like a stored value
+        updated_on = connections[queryset.db].ops.adapt_datetimefield_value(updated_on)
+        queryset = queryset.extra(where=[CURSOR_CONDITION.format(Contact._meta.db_table)], params=[updated_on, pk])
+    queryset = contact_rows.values(queryset.order_by('updated_on', 'id'))
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        cursor = encode_cursor(rows[-1]['updated_on'], rows[-1]['id'])
+    return contact_rows.to_representation(rows), cursor, has_more
@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+from model_mommy import mommy
+
+from contact.file_import import Checkpoint, describe_source
+from contact.models import ContactBook, Contact, ContactBookStats
+
+
+class ExplainQueriesCommandTest(TestCase):
+    def setUp(self):
+        self.instance = mommy.make(Contact)
+
+    def test_explain_queries(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('-- live contacts of a contact book', out.getvalue())
+
+
+class GenerateContactsCommandTest(TestCase):
+    def test_generate_contacts_is_deterministic(self):
+        call_command('generate_contacts', books=3, contacts_per_book=7, batch_size=5, stdout=StringIO())
+        self.assertEqual(ContactBook.objects.count(), 3)
+        self.assertEqual(Contact.objects.count(), 21)
+        first_run = list(Contact.objects.order_by('id').values_list('name', 'deleted'))
+
+        Contact.objects.all().delete()
+        ContactBook.objects.all().delete()
+        call_command('generate_contacts', books=3, contacts_per_book=7, batch_size=5, stdout=StringIO())
+        self.assertEqual(list(Contact.objects.order_by('id').values_list('name', 'deleted')), first_run)
+
+
+class BenchmarkApiCommandTest(TestCase):
+    def test_benchmark_api(self):
+        call_command('generate_contacts', books=2, contacts_per_book=5, deleted_ratio=0, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_api', iterations=2, warmup=0, stdout=out)
+        self.assertIn('contact_list', out.getvalue())
+        self.assertIn('contact_create', out.getvalue())
+        self.assertEqual(Contact.objects.count(), 10)
+        # the locust load test logs in with the benchmark credentials
+        response = Client().post(reverse('login'), {'username': 'benchmark', 'password': 'benchmark'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', json.loads(response.content.decode('utf8')))
+
+
+class RebuildContactBookStatsCommandTest(TestCase):
+    def test_rebuild_contact_book_stats(self):
+        contact_book = mommy.make(ContactBook)
+        mommy.make(Contact, contact_book=contact_book, _quantity=3)
+        mommy.make(Contact, contact_book=contact_book, deleted=True)
+        ContactBookStats.objects.create(contact_book=contact_book, live_count=42)
+
+        out = StringIO()
+        call_command('rebuild_contact_book_stats', stdout=out)
+        self.assertIn('1 contact books rebuilt', out.getvalue())
+        stats = ContactBookStats.objects.get(contact_book=contact_book)
+        self.assertEqual((stats.live_count, stats.deleted_count), (3, 1))
+        self.assertIsNotNone(stats.rebuilt_on)
+
+
+class BenchmarkConcurrencyCommandTest(TransactionTestCase):
+    # the in-process server answers from other threads, they only see committed rows
+    def test_benchmark_concurrency(self):
+        call_command('generate_contacts', books=1, contacts_per_book=3, deleted_ratio=0, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_concurrency', threads='1,2', clients=3, requests=2, query_delay_ms=1, stdout=out)
+        self.assertIn('  2 threads', out.getvalue())
+        self.assertNotRegex(out.getvalue(), r'errors [1-9]')
+
+
+class FindDuplicateContactsCommandTest(TestCase):
+    def setUp(self):
+        self.contact_books = mommy.make(ContactBook, _quantity=3)
+        mommy.make(Contact, contact_book=self.contact_books[0], email='ann@example.com')
+        mommy.make(Contact, contact_book=self.contact_books[1], email='Ann@Example.com')
+        mommy.make(Contact, contact_book=self.contact_books[2], email=' ann@example.com ')
+        mommy.make(Contact, contact_book=self.contact_books[2], email='bob@example.com')
+        mommy.make(Contact, contact_book=self.contact_books[0], email='BOB@example.com', deleted=True)
+        mommy.make(Contact, contact_book=self.contact_books[0], email='eve@example.com')
+
+    def test_find_duplicate_contacts(self):
+        out = StringIO()
+        call_command('find_duplicate_contacts', stdout=out)
+        self.assertIn('1 duplicate clusters, 3 contacts', out.getvalue())
+        # every partition pass finds its share of the clusters
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'duplicates.json')
+        out = StringIO()
+        call_command('find_duplicate_contacts', partitions=3, chunk_size=2, output=path, stdout=out)
+        self.assertIn('1 duplicate clusters, 3 contacts', out.getvalue())
+        with open(path) as stream:
+            clusters = json.load(stream)
+        self.assertEqual([(cluster['email'], len(cluster['contacts'])) for cluster in clusters],
+                         [('ann@example.com', 3)])
+
+    def test_find_contact_book_duplicates(self):
+        out = StringIO()
+        call_command('find_duplicate_contacts', contact_books=[self.contact_books[0].id, self.contact_books[1].id],
+                     verbosity=2, stdout=out)
+        self.assertIn('ann@example.com: 3 contacts in contact books {}'.format(
+            ', '.join(str(contact_book.id) for contact_book in self.contact_books)), out.getvalue())
+        self.assertIn('1 duplicate clusters, 3 contacts', out.getvalue())
+
+
+class ImportContactsCommandTest(TestCase):
+    def setUp(self):
+        self.contact_book = mommy.make(ContactBook)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write('contacts.csv', 'name,email,contact_book\n' + ''.join(
+            'Contact {0},contact{0}@example.com,{1}\n'.format(index, self.contact_book.id) for index in range(5)) +
+            'Bad,not-an-email,{0}\n{1},long@example.com,{0}\nNo Book,nobook@example.com,{2}\n'.format(
+                self.contact_book.id, 'x' * 256, self.contact_book.id + 100))
+        errors = os.path.join(self.directory, 'errors.ndjson')
+        out = StringIO()
+        call_command('import_contacts', path, batch_size=3, workers=0, errors=errors, stdout=out)
+        self.assertIn('5 contacts created, 0 already existing, 3 rows failed', out.getvalue())
+        self.assertEqual(Contact.objects.filter(contact_book=self.contact_book).count(), 5)
+        self.assertEqual(ContactBookStats.objects.get(contact_book=self.contact_book).live_count, 5)
+        with open(errors) as stream:
+            failed = [json.loads(line) for line in stream]
+        self.assertEqual([(row['row'], sorted(row['errors'])) for row in failed],
+                         [(5, ['email']), (6, ['name']), (7, ['contact_book'])])
+
+        # every batch is checkpointed, a second run has nothing left to do
+        out = StringIO()
+        call_command('import_contacts', path, batch_size=3, workers=0, stdout=out)
+        self.assertIn('5 contacts created, 0 already existing, 3 rows failed', out.getvalue())
+        self.assertEqual(Contact.objects.count(), 5)
+
+        # without the checkpoint already imported rows are skipped, not duplicated
+        out = StringIO()
+        call_command('import_contacts', path, batch_size=3, workers=0, restart=True, stdout=out)
+        self.assertIn('0 contacts created, 5 already existing, 3 rows failed', out.getvalue())
+
+    def test_import_ndjson_resumes_from_checkpoint(self):
+        path = self.write('contacts.ndjson', ''.join(
+            json.dumps({'name': 'Contact {}'.format(index), 'email': 'contact{}@example.com'.format(index)}) + '\n'
+            for index in range(6)))
+        checkpoint = os.path.join(self.directory, 'import.checkpoint')
+        # an earlier run finished the second batch only
+        Checkpoint(checkpoint, describe_source(path), 2).done({'batch': 1, 'created': 2, 'skipped': 0, 'failed': []})
+        out = StringIO()
+        call_command('import_contacts', path, batch_size=2, workers=0, checkpoint=checkpoint,
+                     contact_book=self.contact_book.id, stdout=out)
+        self.assertIn('6 contacts created', out.getvalue())
+        self.assertEqual(sorted(Contact.objects.values_list('email', flat=True)),
+                         ['contact{}@example.com'.format(index) for index in (0, 1, 4, 5)])
+
+        with self.assertRaises(CommandError):
+            call_command('import_contacts', path, batch_size=3, workers=0, checkpoint=checkpoint,
+                         contact_book=self.contact_book.id, stdout=StringIO())
+
+    def test_workers_on_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only SQLite limits the workers')
+        path = self.write('contacts.ndjson', json.dumps({'name': 'Contact', 'email': 'contact@example.com'}) + '\n')
+        with self.assertRaises(CommandError):
+            call_command('import_contacts', path, workers=2, contact_book=self.contact_book.id, stdout=StringIO())
+        # imports in this process by default
+        call_command('import_contacts', path, contact_book=self.contact_book.id, stdout=StringIO())
+        self.assertEqual(Contact.objects.count(), 1)
+
+
+class ImportContactsWorkersTest(TransactionTestCase):
+    def setUp(self):
+        self.contact_book = mommy.make(ContactBook)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'contacts.ndjson')
+        with open(self.path, 'w') as stream:
+            for index in range(5):
+                stream.write(json.dumps({'name': 'Contact {}'.format(index),
+                                         'email': 'contact{}@example.com'.format(index)}) + '\n')
+
+    @contextmanager
+    def shared_database(self):
+        """
+        Spawned workers cannot open the in-memory SQLite test database, they get a file copy of it.
+        """
+        if connection.vendor != 'sqlite':
+            yield
+            return
+        connection.ensure_connection()
+        path = os.path.join(self.directory, 'db.sqlite3')
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+        # closing the in-memory connection would drop the test database, it is put back afterwards
+        memory, connection.connection = connection.connection, None
+        name, connection.settings_dict['NAME'] = connection.settings_dict['NAME'], path
+        try:
+            yield
+        finally:
+            connection.close()
+            connection.settings_dict['NAME'] = name
+            connection.connection = memory
+
+    def test_import_in_worker_process(self):
+        with self.shared_database():
+            out = StringIO()
+            call_command('import_contacts', self.path, batch_size=2, workers=1, contact_book=self.contact_book.id,
+                         stdout=out)
+            self.assertIn('5 contacts created', out.getvalue())
+            self.assertEqual(Contact.objects.filter(contact_book=self.contact_book).count(), 5)
+            self.assertEqual(ContactBookStats.objects.get(contact_book=self.contact_book).live_count, 5)
+
+    def test_failed_worker_points_at_checkpoint(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('breaks a copy of the SQLite test database')
+        with self.shared_database():
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE {}'.format(ContactBookStats._meta.db_table))
+            with self.assertRaisesRegex(CommandError, 'Batch 0 failed.*{}'.format(
+                    os.path.basename(self.path) + '.checkpoint')):
+                call_command('import_contacts', self.path, workers=1, contact_book=self.contact_book.id,
+                             stdout=StringIO())
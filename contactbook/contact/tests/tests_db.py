@@ -0,0 +1,105 @@
+import json
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from contact.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+        self.usable = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(TestCase):
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        return ConnectionPool(connect=connect, check=lambda connection: connection.usable, **kwargs)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(len(self.opened), 1)
+        stats = pool.stats()
+        self.assertEqual((stats['checkouts'], stats['open'], stats['in_use'], stats['idle']), (2, 1, 1, 0))
+
+    def test_checkout_waits_for_a_returned_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, args=(connection,))
+        timer.start()
+        self.assertIs(pool.checkout(), connection)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_checkout_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_broken_and_old_connections_are_replaced(self):
+        pool = self.make_pool(max_size=1, health_check_interval=0)
+        connection = pool.checkout()
+        connection.usable = False
+        pool.checkin(connection)
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+        pool.max_age = 0
+        pool.checkin(replacement)
+        self.assertIsNot(pool.checkout(), replacement)
+        self.assertEqual(pool.stats()['open'], 1)
+
+    def test_discarded_connections_free_their_slot(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.checkin(pool.checkout(), discard=True)
+        pool.checkout()
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(len(self.opened), 2)
+
+
+class DatabaseDiagnosticsTest(APITestCase):
+    def setUp(self):
+        self.url = reverse('db_diagnostics')
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.admin_user = User.objects.create_superuser('adminUser', 'admin@example.com', 'adminPassword')
+
+    def login(self, username, password):
+        response = self.client.post(reverse('login'), {"username": username, "password": password})
+        self.client.credentials(HTTP_AUTHORIZATION="Token {}".format(json.loads(response.content.decode('utf8'))["token"]))
+
+    def test_diagnostics_require_admin(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.login('testUser', 'testPassword')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_diagnostics(self):
+        self.login('adminUser', 'adminPassword')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        default = response.data['data']['default']
+        self.assertIsNone(default['pool'])
+        self.assertIn('connects', default)
+        self.assertIn('health_checks', default)
@@ -1,12 +1,28 @@
 import json
 
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import skipUnless
+
+from django.conf import settings
+from django.test import override_settings
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
 from model_mommy import mommy
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
 
-from contact.models import ContactBook
+from contact import bulk, cache as contact_cache, instrumentation, jobs
+from contact.authentication import invalidate_token, make_token_key
+from contact.cache import get_cache
+from contact.models import ContactBook, Contact, ContactBookDeletionJob, ContactBookStats
+from contact.serializers import ContactSerializer
+from contact.stats import rebuild_contact_book_stats
+from contact.utils import get_or_none
 
 
 class ContactBookTest(APITestCase):
@@ -415,3 +431,1026 @@ class ContactTest(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=self.token)
         response = self.client.post(self.create_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContactListTest(APITestCase):
+    def setUp(self):
+        self.login_url = reverse('login')
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(self.login_url, {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contacts = mommy.make(Contact, contact_book=self.contact_book, _quantity=25)
+        self.list_url = reverse("contact_list")
+        cache.clear()
+        self.contact_book_list_url = reverse("contact_book_list")
+
+    def test_cursor_pagination_walks_all_contacts(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url, {'pagination': 'cursor', 'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(response.data['status_code'], status.HTTP_200_OK)
+        ids = [row['id'] for row in response.data['data']]
+        next_link = response.data['next']
+        while next_link:
+            response = self.client.get(next_link)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in response.data['data'])
+            next_link = response.data['next']
+        self.assertEqual(ids, sorted([contact.id for contact in self.contacts], reverse=True))
+
+    def test_cursor_pagination_query_count(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.client.get(self.list_url, {'pagination': 'cursor'})
+        # the page rows only, no count or list validators
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['data']), 10)
+        self.assertNotIn('ETag', response)
+
+    def test_cursor_pagination_with_count(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url, {'pagination': 'cursor', 'count': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+
+        response = self.client.get(self.contact_book_list_url, {'pagination': 'cursor', 'count': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['data'][0]['id'], self.contact_book.id)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        # token lookup (cached afterwards), page count and page rows
+        with self.assertNumQueries(3):
+            response = self.client.get(self.list_url, {'page_size': 2})
+        self.assertEqual(len(response.data['data']), 2)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, {'page_size': 25})
+        self.assertEqual(len(response.data['data']), 25)
+        self.assertEqual(response.data['data'][0]['contact_book_name'], self.contact_book.name)
+
+        mommy.make(ContactBook, created_by=self.test_user, changed_by=self.test_user, _quantity=5)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.contact_book_list_url, {'page_size': 25})
+        self.assertEqual(response.data['data'][0]['created_by'], self.test_user.username)
+
+    def test_retrieve_query_count(self):
+        contact = self.contacts[0]
+        contact.created_by = contact.changed_by = self.test_user
+        contact.save()
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        # token, the contact's book (its cache version is read before loading) and the payload
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("contact_retrieve", kwargs={"pk": contact.id}))
+        self.assertEqual(response.data['data']['contact_book_name'], self.contact_book.name)
+        self.assertEqual(response.data['data']['changed_by'], self.test_user.username)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("contact_book_retrieve", kwargs={"pk": self.contact_book.id}))
+
+    def test_search_by_name_and_email(self):
+        contact = mommy.make(Contact, contact_book=self.contact_book, name='Findable Person', email='findme@example.org')
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url, {'search': 'findable'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['data']], [contact.id])
+
+        response = self.client.get(self.list_url, {'search': 'findme@example'})
+        self.assertEqual([row['id'] for row in response.data['data']], [contact.id])
+
+    def test_bulk_retrieve_by_ids(self):
+        deleted = mommy.make(Contact, contact_book=self.contact_book, deleted=True)
+        ids = [self.contacts[3].id, deleted.id, 0, self.contacts[0].id]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse("contact_bulk_retrieve"), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['data']
+        self.assertEqual([result['id'] for result in results], ids)
+        self.assertEqual([result['status'] for result in results], ['found', 'deleted', 'missing', 'found'])
+        self.assertEqual(results[0]['contact']['email'], self.contacts[3].email)
+        self.assertEqual(results[0]['contact']['contact_book_name'], self.contact_book.name)
+
+    def test_bulk_retrieve_by_keys(self):
+        keys = [{'contact_book': self.contact_book.id, 'email': self.contacts[1].email},
+                {'contact_book': self.contact_book.id, 'email': 'unknown@example.com'}]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(reverse("contact_bulk_retrieve"), {'keys': keys}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['data']], ['found', 'missing'])
+        self.assertEqual(response.data['data'][0]['contact']['id'], self.contacts[1].id)
+
+    def test_bulk_retrieve_by_keys_across_books(self):
+        other_book = mommy.make(ContactBook)
+        other_contact = mommy.make(Contact, contact_book=other_book, email=self.contacts[2].email)
+        mommy.make(Contact, contact_book=other_book, email=self.contacts[1].email)
+        keys = [{'contact_book': self.contact_book.id, 'email': self.contacts[1].email},
+                {'contact_book': other_book.id, 'email': self.contacts[2].email}]
+        with self.assertNumQueries(1):
+            results = bulk.retrieve_contacts(keys=keys)
+        self.assertEqual([result['contact']['id'] for result in results], [self.contacts[1].id, other_contact.id])
+
+    def test_bulk_retrieve_with_invalid_request(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(reverse("contact_bulk_retrieve"), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(CONTACT_BULK_RETRIEVE_MAX_KEYS=2):
+            response = self.client.post(reverse("contact_bulk_retrieve"), {'ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_partial_update_moves_contacts(self):
+        other_book = mommy.make(ContactBook)
+        ids = [contact.id for contact in self.contacts[:5]]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.patch(reverse("contact_bulk_partial_update"),
+                                     {'ids': ids, 'data': {'contact_book': other_book.id}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['data']['updated'], 5)
+        self.assertEqual(set(Contact.objects.filter(contact_book=other_book).values_list('id', flat=True)), set(ids))
+        self.assertEqual(Contact.objects.filter(id__in=ids, changed_by=self.test_user).count(), 5)
+
+    def test_bulk_partial_update_with_conflicting_email(self):
+        other_book = mommy.make(ContactBook)
+        mommy.make(Contact, contact_book=other_book, email=self.contacts[0].email)
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.patch(reverse("contact_bulk_partial_update"),
+                                     {'ids': [self.contacts[0].id], 'data': {'contact_book': other_book.id}},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['data']['emails'], [self.contacts[0].email])
+
+        response = self.client.patch(reverse("contact_bulk_partial_update"), {'ids': [self.contacts[0].id]},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_soft_delete_by_filter(self):
+        target = self.contacts[2]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.delete(reverse("contact_bulk_soft_delete"), {'filter': {'email': target.email.upper()}},
+                                      format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['data']['deleted'], 1)
+        target.refresh_from_db()
+        self.assertTrue(target.deleted)
+        self.assertEqual(Contact.objects.filter(deleted=True).count(), 1)
+
+        response = self.client.delete(reverse("contact_bulk_soft_delete"), {'filter': {'phone': '1'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(CONTACT_BULK_UPDATE_MAX_ROWS=3):
+            response = self.client.delete(reverse("contact_bulk_soft_delete"),
+                                          {'ids': [contact.id for contact in self.contacts]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_page_number_pagination_is_default(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['data']), 10)
+
+    def test_exact_count_strategy_is_default(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count_strategy'], 'exact')
+
+    @override_settings(CONTACT_LIST_COUNT_STRATEGY='cached')
+    def test_cached_count_strategy(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        email = self.contacts[0].email
+        response = self.client.get(self.list_url, {'email': email})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['count_strategy'], 'cached')
+
+        mommy.make(Contact, email=email)
+        # same filters: the count comes from the cache, only the page rows are queried
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'email': email})
+        self.assertEqual(response.data['count'], 1)
+        # no list validators without an exact count, they would scan every filtered row
+        self.assertNotIn('ETag', response)
+        # other filters are counted again
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 26)
+
+    @override_settings(CONTACT_LIST_COUNT_STRATEGY='estimate')
+    def test_estimate_count_strategy_falls_back_to_exact(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['count_strategy'], 'exact')
+
+    def test_fast_list_serialization_matches_serializer_output(self):
+        Contact.objects.filter(id=self.contacts[0].id).update(name='Zoë \u2028 "quoted"', deleted_on=None,
+                                                              created_by=self.test_user)
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        for url, params in ((self.list_url, {'page_size': 25}), (self.list_url, {'pagination': 'cursor'}),
+                            (self.contact_book_list_url, {})):
+            fast = self.client.get(url, params)
+            with override_settings(CONTACT_FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(url, params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+            self.assertEqual(fast.content, JSONRenderer().render(slow.data))
+        self.assertIn('Zoë \\u2028 \\"quoted\\"'.encode(), self.client.get(self.list_url, {'page_size': 25}).content)
+
+
+class ViewSetQueryCountTest(APITestCase):
+    """
+    Queries of every ContactBookViewSet and ContactViewSet action, with the token cached and the
+    stats of the books built; the lookup of the row is always a single query. Writes include the
+    SAVEPOINT and RELEASE of their atomic block, the test itself runs in a transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.client.credentials(HTTP_AUTHORIZATION="Token {}".format(self.login_data["token"]))
+        self.contact_book = mommy.make(ContactBook)
+        self.other_contact_book = mommy.make(ContactBook)
+        self.contacts = mommy.make(Contact, contact_book=self.contact_book, _quantity=3)
+        for contact_book in (self.contact_book, self.other_contact_book):
+            rebuild_contact_book_stats(contact_book.id)
+        # caches the token
+        self.client.get(reverse("contact_book_retrieve", kwargs={"pk": 999}))
+
+    def test_get_or_none(self):
+        contact = self.contacts[0]
+        with self.assertNumQueries(1):
+            self.assertEqual(get_or_none(Contact, id=contact.id), contact)
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_or_none(Contact, id=999))
+        with self.assertNumQueries(1):
+            instance = get_or_none(Contact, select_related=('contact_book',), only=('id', 'contact_book__name'),
+                                   id=contact.id)
+            self.assertEqual(instance.contact_book.name, self.contact_book.name)
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_or_none(Contact, id='not a number'))
+        # without a deleted flag, and several matches return the last one
+        with self.assertNumQueries(1):
+            self.assertEqual(get_or_none(User, username__startswith='test'), self.test_user)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_or_none(Contact, contact_book=self.contact_book), self.contacts[-1])
+        Contact.objects.filter(id=contact.id).update(deleted=True)
+        self.assertIsNone(get_or_none(Contact, id=contact.id))
+
+    def test_contact_book_actions(self):
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse("contact_book_create"), {'name': 'New Book'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url_kwargs = {"pk": self.contact_book.id}
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("contact_book_retrieve", kwargs=url_kwargs))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # locked lookup and one UPDATE, changed_by is the requesting user and uniqueness is left to the constraint
+        with self.assertNumQueries(4):
+            response = self.client.put(reverse("contact_book_update", kwargs=url_kwargs), {'name': 'Renamed'},
+                                       format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(4):
+            response = self.client.patch(reverse("contact_book_partial_update", kwargs=url_kwargs),
+                                         {'name': 'Renamed again'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(1):
+            response = self.client.delete(reverse("contact_book_soft_delete", kwargs={"pk": 999}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse("contact_book_soft_delete", kwargs=url_kwargs))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse("contact_book_hard_delete/", kwargs=url_kwargs))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_contact_actions(self):
+        contact = self.contacts[0]
+        url_kwargs = {"pk": contact.id}
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse("contact_create"), {
+                'name': 'New', 'email': 'new@example.com', 'contact_book': self.contact_book.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("contact_retrieve", kwargs=url_kwargs))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(5):
+            response = self.client.put(reverse("contact_update", kwargs=url_kwargs), {
+                'name': 'Renamed', 'email': 'renamed@example.com', 'contact_book': self.contact_book.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # moving the contact updates the stats of both books
+        with self.assertNumQueries(7):
+            response = self.client.patch(reverse("contact_partial_update", kwargs=url_kwargs),
+                                         {'contact_book': self.other_contact_book.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse("contact_bulk_retrieve"), {'ids': [contact.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(10):
+            response = self.client.patch(reverse("contact_bulk_partial_update"), {
+                'ids': [contact.id], 'data': {'contact_book': self.contact_book.id}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(5):
+            response = self.client.delete(reverse("contact_soft_delete", kwargs=url_kwargs))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse("contact_bulk_soft_delete"), {'ids': [self.contacts[1].id]},
+                                          format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(5):
+            response = self.client.delete(reverse("contact_hard_delete", kwargs={"pk": self.contacts[2].id}))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with self.assertNumQueries(1):
+            response = self.client.delete(reverse("contact_hard_delete", kwargs={"pk": self.contacts[2].id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unique_violations(self):
+        contact, other = self.contacts[:2]
+        response = self.client.post(reverse("contact_book_create"), {'name': self.contact_book.name}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['data'], {'name': ['This field must be unique.']})
+        response = self.client.patch(reverse("contact_book_partial_update", kwargs={"pk": self.other_contact_book.id}),
+                                     {'name': self.contact_book.name}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['data'], {'name': ['This field must be unique.']})
+
+        response = self.client.patch(reverse("contact_partial_update", kwargs={"pk": contact.id}),
+                                     {'email': other.email}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['data'],
+                         {'non_field_errors': ['The fields contact_book, email must make a unique set.']})
+        self.assertEqual(Contact.objects.get(id=contact.id).email, contact.email)
+
+        response = self.client.patch(reverse("contact_partial_update", kwargs={"pk": contact.id}),
+                                     {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        updated = Contact.objects.get(id=contact.id)
+        self.assertGreater(updated.updated_on, contact.updated_on)
+        self.assertEqual(response.data['data']['updated_on'], ContactSerializer(updated).data['updated_on'])
+        self.assertEqual(updated.changed_by, self.test_user)
+
+
+class ContactBookStatsTest(APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.other_contact_book = mommy.make(ContactBook)
+        self.contacts = mommy.make(Contact, contact_book=self.contact_book, _quantity=3)
+        self.stats_url = reverse("contact_book_stats", kwargs={"pk": self.contact_book.id})
+
+    def get_counts(self, contact_book=None):
+        response = self.client.get(reverse("contact_book_stats", kwargs={"pk": (contact_book or self.contact_book).id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']['live_count'], response.data['data']['deleted_count']
+
+    def assert_stats_match_rebuild(self):
+        for contact_book in (self.contact_book, self.other_contact_book):
+            stored = self.get_counts(contact_book)
+            stats = rebuild_contact_book_stats(contact_book.id)
+            self.assertEqual(stored, (stats.live_count, stats.deleted_count))
+
+    def test_stats_without_token(self):
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stats_of_unknown_contact_book(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(reverse("contact_book_stats", kwargs={"pk": 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_repeated_soft_delete_keeps_stats(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        url = reverse("contact_soft_delete", kwargs={"pk": self.contacts[0].id})
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.get_counts(), (2, 1))
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_counts(), (2, 1))
+        self.assert_stats_match_rebuild()
+
+    def test_writes_maintain_stats(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        # built on first read
+        self.assertEqual(self.get_counts(), (3, 0))
+        with self.assertNumQueries(2):
+            self.get_counts()
+
+        response = self.client.post(reverse("contact_create"), {
+            'name': 'New', 'email': 'new@example.com', 'contact_book': self.contact_book.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_counts(), (4, 0))
+
+        self.client.delete(reverse("contact_soft_delete", kwargs={"pk": self.contacts[0].id}))
+        self.assertEqual(self.get_counts(), (3, 1))
+        self.client.delete(reverse("contact_hard_delete", kwargs={"pk": self.contacts[2].id}))
+        self.assertEqual(self.get_counts(), (2, 1))
+
+        self.client.patch(reverse("contact_partial_update", kwargs={"pk": self.contacts[1].id}),
+                          {'contact_book': self.other_contact_book.id}, format='json')
+        self.assertEqual(self.get_counts(), (1, 1))
+        self.assertEqual(self.get_counts(self.other_contact_book), (1, 0))
+
+        self.client.patch(reverse("contact_bulk_partial_update"), {
+            'ids': [self.contacts[1].id], 'data': {'contact_book': self.contact_book.id}}, format='json')
+        self.client.delete(reverse("contact_bulk_soft_delete"), {'ids': [self.contacts[1].id]}, format='json')
+        self.client.post(reverse("contact_import"), [
+            {'name': 'Imported', 'email': 'imported@example.com', 'contact_book': self.other_contact_book.id}],
+            format='json')
+        self.assert_stats_match_rebuild()
+
+        self.client.delete(reverse("contact_book_soft_delete", kwargs={"pk": self.contact_book.id}))
+        self.assertEqual(self.get_counts(), (0, 3))
+        self.assert_stats_match_rebuild()
+
+
+class ContactImportTest(APITestCase):
+    def setUp(self):
+        self.login_url = reverse('login')
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(self.login_url, {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.existing = mommy.make(Contact, contact_book=self.contact_book, email='taken@example.com')
+        self.import_url = reverse("contact_import")
+
+    def test_import_without_token(self):
+        response = self.client.post(self.import_url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_json_array(self):
+        rows = [
+            {'name': 'One', 'email': 'one@example.com', 'contact_book': self.contact_book.id},
+            {'name': 'Bad', 'email': 'plainaddress', 'contact_book': self.contact_book.id},
+            {'name': 'Taken', 'email': 'taken@example.com', 'contact_book': self.contact_book.id},
+            {'name': 'Two', 'email': 'two@example.com', 'contact_book': self.contact_book.id},
+            {'name': 'Two again', 'email': 'two@example.com', 'contact_book': self.contact_book.id},
+            {'name': 'No book', 'email': 'three@example.com', 'contact_book': 0},
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(self.import_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        report = response.data['data']
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['failed'], 4)
+        self.assertEqual([result['status'] for result in report['results']],
+                         ['created', 'failed', 'failed', 'created', 'failed', 'failed'])
+        self.assertIn('email', report['results'][1]['errors'])
+        self.assertIn('contact_book', report['results'][5]['errors'])
+        created = Contact.objects.filter(contact_book=self.contact_book, email__in=['one@example.com', 'two@example.com'])
+        self.assertEqual(created.count(), 2)
+        self.assertTrue(all(contact.created_by_id == self.test_user.id for contact in created))
+
+    def test_import_csv_upload(self):
+        upload = SimpleUploadedFile('contacts.csv', b'name,email\nOne,one@example.com\nTwo,two@example.com\n',
+                                    content_type='text/csv')
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(self.import_url, {'file': upload, 'contact_book': self.contact_book.id},
+                                    format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['data']['created'], 2)
+        self.assertEqual(Contact.objects.filter(contact_book=self.contact_book).count(), 3)
+
+    def test_import_with_only_invalid_rows(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(self.import_url, [{'name': '', 'email': 'x'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['data']['failed'], 1)
+
+
+class ContactBookExportTest(APITestCase):
+    def setUp(self):
+        self.login_url = reverse('login')
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(self.login_url, {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contacts = mommy.make(Contact, contact_book=self.contact_book, _quantity=5)
+        mommy.make(Contact, contact_book=self.contact_book, deleted=True)
+        self.export_url = reverse("contact_book_export", kwargs={"pk": self.contact_book.id})
+
+    def test_export_without_token(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_csv(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode('utf8').splitlines()
+        self.assertEqual(lines[0], 'id,name,email,created_on,updated_on,created_by,changed_by')
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], [contact.id for contact in self.contacts])
+
+    def test_export_ndjson(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.export_url, {'output': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf8').splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['email'], Contact.objects.filter(deleted=False).order_by('id')[0].email)
+
+    def test_export_invalid_request(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.export_url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse("contact_book_export", kwargs={"pk": self.contact_book.id + 1}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CONTACT_SYNC_SETTLE_SECONDS=0)
+class ContactBookChangesTest(APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contacts = [mommy.make(Contact, contact_book=self.contact_book) for _ in range(3)]
+        mommy.make(Contact, _quantity=2)
+        self.changes_url = reverse("contact_book_changes", kwargs={"pk": self.contact_book.id})
+
+    def test_changes_since_cursor(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.changes_url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual([row['id'] for row in data['contacts']], [contact.id for contact in self.contacts[:2]])
+        self.assertTrue(data['has_more'])
+
+        data = self.client.get(self.changes_url, {'page_size': 2, 'cursor': data['cursor']}).data['data']
+        self.assertEqual([row['id'] for row in data['contacts']], [self.contacts[2].id])
+        self.assertFalse(data['has_more'])
+        cursor = data['cursor']
+
+        data = self.client.get(self.changes_url, {'cursor': cursor}).data['data']
+        self.assertEqual(data['contacts'], [])
+        self.assertEqual(data['cursor'], cursor)
+
+        # an update and a soft delete both show up, the deleted contact as a tombstone
+        self.client.patch(reverse("contact_partial_update", kwargs={"pk": self.contacts[1].id}),
+                          {'name': 'Renamed'}, format='json')
+        self.client.delete(reverse("contact_soft_delete", kwargs={"pk": self.contacts[0].id}))
+        data = self.client.get(self.changes_url, {'cursor': cursor}).data['data']
+        self.assertEqual([(row['id'], row['name'], row['deleted']) for row in data['contacts']], [
+            (self.contacts[1].id, 'Renamed', False), (self.contacts[0].id, self.contacts[0].name, True)])
+
+    def test_changes_with_the_same_updated_on(self):
+        # bulk updates, soft deletes of books and import batches stamp one timestamp on many rows
+        Contact.objects.filter(contact_book=self.contact_book).update(updated_on=self.contacts[0].updated_on)
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        ids, cursor, has_more = [], None, True
+        while has_more:
+            data = self.client.get(self.changes_url, {'page_size': 1, 'cursor': cursor or ''}).data['data']
+            ids.extend(row['id'] for row in data['contacts'])
+            cursor, has_more = data['cursor'], data['has_more']
+        self.assertEqual(ids, sorted(contact.id for contact in self.contacts))
+
+    @override_settings(CONTACT_SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_are_held_back(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        data = self.client.get(self.changes_url).data['data']
+        self.assertEqual(data['contacts'], [])
+        self.assertIsNone(data['cursor'])
+
+    def test_changes_invalid_request(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.changes_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse("contact_book_changes", kwargs={"pk": self.contact_book.id + 100}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ContactBookDuplicatesTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book, self.other_book = mommy.make(ContactBook, _quantity=2)
+        self.contact = mommy.make(Contact, contact_book=self.contact_book, email='ann@example.com')
+        self.duplicate = mommy.make(Contact, contact_book=self.other_book, email='ANN@example.com')
+        mommy.make(Contact, contact_book=self.contact_book, email='bob@example.com')
+        self.duplicates_url = reverse("contact_book_duplicates", kwargs={"pk": self.contact_book.id})
+
+    def test_contact_book_duplicates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.duplicates_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['clusters'], [{
+            'email': 'ann@example.com',
+            'contact_books': [self.contact_book.id, self.other_book.id],
+            'contacts': [{'id': self.contact.id, 'contact_book': self.contact_book.id},
+                         {'id': self.duplicate.id, 'contact_book': self.other_book.id}],
+        }])
+
+        # the report is cached until it ages out or is refreshed
+        mommy.make(Contact, contact_book=self.other_book, email='Bob@example.com')
+        response = self.client.get(self.duplicates_url)
+        self.assertEqual(len(response.data['data']['clusters']), 1)
+        response = self.client.get(self.duplicates_url, {'refresh': 'true'})
+        self.assertEqual([cluster['email'] for cluster in response.data['data']['clusters']],
+                         ['ann@example.com', 'bob@example.com'])
+
+        response = self.client.get(reverse("contact_book_duplicates", kwargs={"pk": self.other_book.id + 100}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RetrieveCacheTest(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contact = mommy.make(Contact, contact_book=self.contact_book)
+        self.contact_url = reverse("contact_retrieve", kwargs={"pk": self.contact.id})
+        self.contact_book_url = reverse("contact_book_retrieve", kwargs={"pk": self.contact_book.id})
+
+    def test_retrieve_hits_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.client.get(self.contact_url)
+        self.client.get(self.contact_book_url)
+        # token and payloads are both served from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get(self.contact_url)
+        self.assertEqual(response.data['data']['email'], self.contact.email)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.contact_book_url)
+        self.assertEqual(response.data['data']['name'], self.contact_book.name)
+
+    def test_writes_invalidate_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.client.get(self.contact_url)
+        self.client.patch(reverse("contact_partial_update", kwargs={"pk": self.contact.id}),
+                          {'name': 'Renamed'}, format='json')
+        response = self.client.get(self.contact_url)
+        self.assertEqual(response.data['data']['name'], 'Renamed')
+
+        self.client.patch(reverse("contact_book_partial_update", kwargs={"pk": self.contact_book.id}),
+                          {'name': 'Renamed Book'}, format='json')
+        response = self.client.get(self.contact_url)
+        self.assertEqual(response.data['data']['contact_book_name'], 'Renamed Book')
+
+        self.client.delete(reverse("contact_book_soft_delete", kwargs={"pk": self.contact_book.id}))
+        response = self.client.get(self.contact_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.contact_book_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_invalidation_during_load_is_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        def load_and_rename(model, instance, name):
+            def load():
+                payload = {'id': instance.id, 'name': model.objects.get(id=instance.id).name}
+                # an update committing between the load and cache.set
+                model.objects.filter(id=instance.id).update(name=name)
+                contact_cache.invalidate(model, instance.id)
+                return payload
+            return load
+
+        payload = contact_cache.get_or_load(ContactBook, self.contact_book.id,
+                                            load_and_rename(ContactBook, self.contact_book, 'Renamed Book'))
+        self.assertEqual(payload['name'], self.contact_book.name)
+        response = self.client.get(self.contact_book_url)
+        self.assertEqual(response.data['data']['name'], 'Renamed Book')
+
+        def load_contact():
+            load_and_rename(ContactBook, self.contact_book, 'Renamed Again')()
+            return {'id': self.contact.id, 'contact_book_name': 'Renamed Book'}
+
+        contact_cache.get_or_load(Contact, self.contact.id, load_contact, ((ContactBook, self.contact_book.id),))
+        response = self.client.get(self.contact_url)
+        self.assertEqual(response.data['data']['contact_book_name'], 'Renamed Again')
+
+
+class ConditionalRequestTest(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contact = mommy.make(Contact, contact_book=self.contact_book)
+        self.contact_url = reverse("contact_retrieve", kwargs={"pk": self.contact.id})
+        self.contact_book_url = reverse("contact_book_retrieve", kwargs={"pk": self.contact_book.id})
+        self.list_url = reverse("contact_list")
+
+    def test_retrieve_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.contact_url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.contact_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # renaming the book changes contact_book_name and so the contact's ETag
+        self.client.patch(reverse("contact_book_partial_update", kwargs={"pk": self.contact_book.id}),
+                          {'name': 'Renamed Book'}, format='json')
+        response = self.client.get(self.contact_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['contact_book_name'], 'Renamed Book')
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get(self.contact_book_url)
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.contact_book_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url)
+        etag = response['ETag']
+        # the token is cached, only the validators aggregate is queried
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(reverse("contact_partial_update", kwargs={"pk": self.contact.id}),
+                          {'name': 'Renamed'}, format='json')
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        self.client.delete(reverse("contact_hard_delete", kwargs={"pk": self.contact.id}))
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_update_if_match(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        update_url = reverse("contact_partial_update", kwargs={"pk": self.contact.id})
+        etag = self.client.get(self.contact_url)['ETag']
+        response = self.client.patch(update_url, {'name': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.contact_url)['ETag'], response['ETag'])
+
+        # a second writer still holding the old ETag does not overwrite the first one
+        response = self.client.patch(update_url, {'name': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Contact.objects.get(id=self.contact.id).name, 'First')
+
+        etag = self.client.get(self.contact_book_url)['ETag']
+        response = self.client.put(reverse("contact_book_update", kwargs={"pk": self.contact_book.id}),
+                                   {'name': 'Renamed Book'}, format='json', HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.put(reverse("contact_book_update", kwargs={"pk": self.contact_book.id}),
+                                   {'name': 'Renamed Book'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+
+@override_settings(CONTACT_BOOK_DELETE_WORKERS=0, CONTACT_BOOK_DELETE_CHUNK_SIZE=3)
+class ContactBookBackgroundDeleteTest(APITransactionTestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        mommy.make(Contact, contact_book=self.contact_book, _quantity=10)
+        self.other_contact = mommy.make(Contact)
+        self.soft_delete_url = reverse("contact_book_soft_delete", kwargs={"pk": self.contact_book.id})
+
+    def test_background_soft_delete(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.delete(self.soft_delete_url + '?background=true')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['data']['id']
+
+        response = self.client.get(reverse("contact_book_delete_job", kwargs={"pk": job_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['status'], 'done')
+        self.assertEqual(response.data['data']['processed'], 10)
+
+        self.contact_book.refresh_from_db()
+        self.assertTrue(self.contact_book.deleted)
+        contacts = Contact.objects.filter(contact_book=self.contact_book)
+        self.assertFalse(contacts.filter(deleted=False).exists())
+        self.assertEqual(set(contacts.values_list('deleted_on', flat=True)), {self.contact_book.deleted_on})
+        self.other_contact.refresh_from_db()
+        self.assertFalse(self.other_contact.deleted)
+
+        stats = ContactBookStats.objects.get(contact_book=self.contact_book)
+        self.assertEqual((stats.live_count, stats.deleted_count), (0, 10))
+
+    def test_background_soft_delete_drops_cached_contacts(self):
+        cache.clear()
+        contact = Contact.objects.filter(contact_book=self.contact_book).first()
+        retrieve_url = reverse("contact_retrieve", kwargs={"pk": contact.id})
+        job = ContactBookDeletionJob.objects.create(contact_book=self.contact_book, deleted_on=timezone.now(),
+                                                    created_by=self.test_user)
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        # read after the request invalidated the book and before the job's chunk reached the contact
+        self.assertFalse(self.client.get(retrieve_url).data['data']['deleted'])
+        jobs.run_contact_book_deletion(job.id)
+        self.assertEqual(self.client.get(retrieve_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_job(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(reverse("contact_book_delete_job", kwargs={"pk": 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.retrieve_url = reverse("contact_book_retrieve", kwargs={"pk": self.contact_book.id})
+
+    def test_token_is_resolved_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_invalidates_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(self.client.get(self.retrieve_url).status_code, status.HTTP_200_OK)
+        response = self.client.delete(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_stops_authenticating(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(self.client.get(self.retrieve_url).status_code, status.HTTP_200_OK)
+        # as the admin or a user deletion would, without going through the logout
+        Token.objects.filter(key=self.login_data["token"]).delete()
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_stops_authenticating(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(self.client.get(self.retrieve_url).status_code, status.HTTP_200_OK)
+        self.test_user.is_active = False
+        self.test_user.save()
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_CACHE_SINGLE_PROCESS=False)
+    def test_process_local_cache_is_not_trusted(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.client.get(self.retrieve_url)
+        # another worker's logout would not reach this process' cache, the token is read every time
+        with self.assertNumQueries(1):
+            response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_revoked_token_is_not_trusted_from_shared_cache(self):
+        key = self.login_data["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        self.client.get(self.retrieve_url)
+        credentials = get_cache().get(make_token_key(key))
+        self.assertEqual(credentials['user']['username'], 'testUser')
+        self.assertNotIn('password', credentials['user'])
+
+        Token.objects.filter(key=key).delete()
+        invalidate_token(key)
+        # a request that read the token before the logout writes it back afterwards
+        get_cache().set(make_token_key(key), credentials)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a "replica" database, see contactbook/settings_test.py')
+@override_settings(CONTACT_DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(APITestCase):
+    # the replica is a separate empty database, rows created on the primary are not replicated to it
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.login_data = self.client.post(reverse('login'), {"username": "testUser", "password": "testPassword"}).content
+        self.login_data = json.loads(self.login_data.decode('utf8'))
+        self.token = "Token {}".format(self.login_data["token"])
+        self.contact_book = mommy.make(ContactBook)
+        self.contact = mommy.make(Contact, contact_book=self.contact_book)
+        self.list_url = reverse("contact_list")
+        self.retrieve_url = reverse("contact_retrieve", kwargs={"pk": self.contact.id})
+        cache.clear()
+
+    def test_reads_go_to_replica(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get(reverse("contact_book_list"))
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # writes and their reads stay on the primary
+        response = self.client.patch(reverse("contact_partial_update", kwargs={"pk": self.contact.id}),
+                                     {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_reads_stay_on_primary_after_write(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.post(reverse("contact_create"), {
+            'name': 'New', 'email': 'new@example.com', 'contact_book': self.contact_book.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with override_settings(CONTACT_READ_YOUR_WRITES_WINDOW=0):
+            self.client.post(reverse("contact_create"), {
+                'name': 'Other', 'email': 'other@example.com', 'contact_book': self.contact_book.id}, format='json')
+        cache.clear()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_primary_reads_ignore_payloads_cached_from_replica(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        stale_book = ContactBook.objects.using('replica').create(name='Stale')
+        Contact.objects.using('replica').create(id=self.contact.id, contact_book=stale_book, name=self.contact.name,
+                                                email=self.contact.email)
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.data['data']['contact_book_name'], 'Stale')
+
+        self.client.patch(reverse("contact_book_partial_update", kwargs={"pk": self.contact_book.id}),
+                          {'name': 'Fresh'}, format='json')
+        response = self.client.get(self.retrieve_url)
+        self.assertEqual(response.data['data']['contact_book_name'], 'Fresh')
+
+
+
+class InstrumentationTest(APITestCase):
+    def setUp(self):
+        instrumentation.registry.clear()
+        self.url = reverse('metrics')
+        self.test_user = User.objects.create_user('testUser', 'test@example.com', 'testPassword')
+        self.admin_user = User.objects.create_superuser('adminUser', 'admin@example.com', 'adminPassword')
+        mommy.make(Contact, _quantity=3)
+
+    def login(self, username, password):
+        response = self.client.post(reverse('login'), {"username": username, "password": password})
+        token = json.loads(response.content.decode('utf8'))["token"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token {}".format(token))
+
+    def test_metrics_require_admin(self):
+        self.login('testUser', 'testPassword')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics(self):
+        self.login('adminUser', 'adminPassword')
+        self.client.get(reverse('contact_list'))
+        self.client.get(reverse('contact_list'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode('utf8').splitlines()
+        labels = '{view="contact_list",method="GET",status="200"}'
+        self.assertIn('# TYPE contactbook_request_duration_seconds histogram', lines)
+        self.assertIn('contactbook_request_duration_seconds_count' + labels + ' 2', lines)
+        self.assertIn('contactbook_request_duration_seconds_bucket{view="contact_list",method="GET",status="200",'
+                      'le="+Inf"} 2', lines)
+        # validators aggregate and page rows of each request, the token is only looked up once
+        self.assertIn('contactbook_request_db_queries_sum' + labels + ' 5.0', lines)
+        for name in ('db_duration_seconds', 'serialize_duration_seconds', 'render_duration_seconds'):
+            self.assertIn('contactbook_request_{}_count{} 2'.format(name, labels), lines)
+        size = [line for line in lines if line.startswith('contactbook_response_size_bytes_sum' + labels)][0]
+        self.assertGreater(float(size.split()[-1]), 0)
+
+    def test_streaming_response_metrics(self):
+        self.login('adminUser', 'adminPassword')
+        contact_book = mommy.make(ContactBook)
+        mommy.make(Contact, contact_book=contact_book, _quantity=3)
+        response = self.client.get(reverse('contact_book_export', kwargs={'pk': contact_book.id}))
+        labels = '{view="contact_book_export",method="GET",status="200"}'
+        # nothing is recorded before the body is sent
+        self.assertNotIn(labels, instrumentation.registry.exposition())
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+        lines = instrumentation.registry.exposition().splitlines()
+        self.assertIn('contactbook_request_duration_seconds_count' + labels + ' 1', lines)
+        # token and book lookups, then the contact rows read while streaming
+        self.assertIn('contactbook_request_db_queries_sum' + labels + ' 3.0', lines)
+        self.assertFalse([line for line in lines if line.startswith('contactbook_response_size_bytes_count' + labels)])
+        self.assertIsNone(instrumentation.current_record())
+
+    def test_slow_request_log(self):
+        self.login('adminUser', 'adminPassword')
+        with override_settings(CONTACT_SLOW_REQUEST_SECONDS=0), \
+                self.assertLogs('contact.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('contact_list'))
+        self.assertIn('Slow request GET /api/contact-list/ (contact_list) 200', logs.output[0])
+        self.assertIn('FROM "contact_contact"', logs.output[0])
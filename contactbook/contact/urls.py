@@ -17,6 +17,16 @@ urlpatterns = [
         {'delete': 'soft_delete'}), name='contact_book_soft_delete'),
     re_path(r'^contact-book-hard-delete/(?P<pk>[0-9]+)/$', views.ContactBookViewSet.as_view(
         {'delete': 'hard_delete'}), name='contact_book_hard_delete/'),
+    re_path(r'^contact-book-delete-job/(?P<pk>[0-9]+)/$', views.ContactBookDeletionJobView.as_view(),
+            name='contact_book_delete_job'),
+    re_path(r'^contact-book-stats/(?P<pk>[0-9]+)/$', views.ContactBookStatsView.as_view(),
+            name='contact_book_stats'),
+    re_path(r'^contact-book-changes/(?P<pk>[0-9]+)/$', views.ContactBookChangesView.as_view(),
+            name='contact_book_changes'),
+    re_path(r'^contact-book-duplicates/(?P<pk>[0-9]+)/$', views.ContactBookDuplicatesView.as_view(),
+            name='contact_book_duplicates'),
+    re_path(r'^contact-book-export/(?P<pk>[0-9]+)/$', views.ContactBookExportView.as_view(),
+            name='contact_book_export'),
 
     # Contact  URLS
     re_path(r'^contact-list/$', views.ContactListView.as_view(), name='contact_list'),
@@ -24,6 +34,12 @@ urlpatterns = [
         {'post': 'create'}), name='contact_create'),
     re_path(r'^contact-retrieve/(?P<pk>[0-9]+)/$', views.ContactViewSet.as_view(
         {'get': 'retrieve'}), name='contact_retrieve'),
+    re_path(r'^contact-bulk-retrieve/$', views.ContactViewSet.as_view(
+        {'post': 'bulk_retrieve'}), name='contact_bulk_retrieve'),
+    re_path(r'^contact-bulk-partial-update/$', views.ContactViewSet.as_view(
+        {'patch': 'bulk_partial_update'}), name='contact_bulk_partial_update'),
+    re_path(r'^contact-bulk-soft-delete/$', views.ContactViewSet.as_view(
+        {'delete': 'bulk_soft_delete'}), name='contact_bulk_soft_delete'),
     re_path(r'^contact-update/(?P<pk>[0-9]+)/$', views.ContactViewSet.as_view(
         {'put': 'update'}), name='contact_update'),
     re_path(r'^contact-partial-update/(?P<pk>[0-9]+)/$', views.ContactViewSet.as_view(
@@ -32,6 +48,11 @@ urlpatterns = [
         {'delete': 'soft_delete'}), name='contact_soft_delete'),
     re_path(r'^contact-hard-delete/(?P<pk>[0-9]+)/$', views.ContactViewSet.as_view(
         {'delete': 'hard_delete'}), name='contact_hard_delete'),
+    re_path(r'^contact-import/$', views.ContactImportView.as_view(), name='contact_import'),
+
+    # diagnostics
+    re_path(r'^db-diagnostics/$', views.DatabaseDiagnosticsView.as_view(), name='db_diagnostics'),
+    re_path(r'^metrics/$', views.MetricsView.as_view(), name='metrics'),
 
     # authentication
     re_path(r'^login/$', views.UserLogin.as_view(), name='login'),
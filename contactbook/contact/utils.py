@@ -1,8 +1,10 @@
 import random
 import string
 
-from django.core.exceptions import FieldError
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import QuerySet
 from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST
 
 
 def success_response(status, msg, data, *args, **kwargs):
@@ -25,24 +27,49 @@ def error_response(status, msg, data, *args, **kwargs):
     return Response(data=response, status=status)
 
 
-def get_or_none(model, **kwargs):
+def unique_violation_response(serializer):
+    """
+    Called while handling the IntegrityError of a serializer's write: a unique violation is answered
+    like a failed validation, any other integrity error is raised again.
+    """
+    errors = serializer.get_unique_errors()
+    if not errors:
+        raise
+    return error_response(status=HTTP_400_BAD_REQUEST, msg='Invalid data', data=errors)
+
+
+def get_or_none(model, select_related=(), only=(), for_update=False, **kwargs):
+    """
+    Looks a row up with exactly one query, None when nothing matches or the lookup values are invalid.
+    Rows of models with a `deleted` flag must be live; when several rows match, the last one (by pk)
+    is returned.
+    :param model: model class, or a queryset of it
+    :param select_related: relations to join into the same query
+    :param only: fields to load, everything by default
+    :param for_update: lock the row (not the joined ones) until the end of the surrounding transaction
+    """
+    queryset = model if isinstance(model, QuerySet) else model.objects.all()
+    if has_field(queryset.model, 'deleted'):
+        kwargs.setdefault('deleted', False)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if only:
+        queryset = queryset.only(*only)
+    if for_update:
+        queryset = queryset.select_for_update(of=('self',))
     try:
-        return model.objects.get(**kwargs, deleted=False)
-    except (model.DoesNotExist, ValueError) as err:
+        rows = list(queryset.filter(**kwargs).order_by('-pk')[:1])
+    except (ValueError, TypeError, ValidationError):
         return None
-    except model.MultipleObjectsReturned:
-        return model.objects.filter(**kwargs).last()
-    except TypeError:
-        return None
-    except FieldError:
-        try:
-            return model.objects.get(**kwargs)
-        except (model.DoesNotExist, ValueError) as err:
-            return None
-        except model.MultipleObjectsReturned:
-            return model.objects.filter(**kwargs).last()
-        except TypeError:
-            return None
+    return rows[0] if rows else None
+
+
+def has_field(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
 
 
 def generate_random_string(N=8):
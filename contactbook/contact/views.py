@@ -1,24 +1,90 @@
 from datetime import datetime
 
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status, generics, filters
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from contact import cache, conditional, instrumentation, stats
+from contact.bulk import ContactImporter, read_csv_rows, retrieve_contacts, get_bulk_retrieve_max_keys, \
+    get_bulk_update_max_rows, lock_contact_ids, find_move_conflicts, bulk_update_contacts, bulk_soft_delete_contacts
+from contact.db.monitoring import get_connection_stats
+from contact.duplicates import get_contact_book_duplicates
+from contact.export import EXPORT_STREAMS, EXPORT_CONTENT_TYPES
 from contact.filters import ContactBookFilter, ContactFilter
-from contact.models import ContactBook, Contact
-from contact.search import CustomSearch
-from contact.serializers import ContactBookSerializer, ContactSerializer
-from contact.utils import success_response, error_response, get_or_none
+from contact.jobs import enqueue_contact_book_deletion
+from contact.models import ContactBook, Contact, ContactBookDeletionJob
+from contact.pagination import PaginationModeMixin, StandardResultsSetCursorPagination
+from contact.routers import ReplicaReadMixin
+from contact.search import FullTextSearch
+from contact.sync import changed_contacts, get_sync_max_page_size, InvalidCursor
+from contact.serializers import ContactBookSerializer, ContactSerializer, ContactBookDeletionJobSerializer, \
+    ContactBulkRetrieveSerializer, ContactSelectionSerializer, ContactBulkUpdateSerializer, ContactBookStatsSerializer, \
+    contact_rows, contact_book_rows
+from contact.utils import success_response, error_response, get_or_none, unique_violation_response
 
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
 
-class ContactBookListView(generics.ListAPIView):
+
+class FastListMixin(object):
+    """
+    Serializes list pages from `.values()` rows with `values_serializer` instead of building a
+    serializer per row, switched off with CONTACT_FAST_LIST_SERIALIZATION = False.
+    """
+    values_serializer = None
+
+    def use_fast_serialization(self):
+        return self.values_serializer is not None and getattr(settings, 'CONTACT_FAST_LIST_SERIALIZATION', True)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.use_fast_serialization():
+            return self.values_serializer.values(queryset)
+        return queryset
+
+    def serialize_list(self, rows):
+        with instrumentation.timed('serialize'):
+            if self.use_fast_serialization():
+                return self.values_serializer.to_representation(rows)
+            return self.get_serializer(rows, many=True).data
+
+
+class ConditionalListMixin(object):
+    """
+    Answers list requests with 304 before paginating or serializing when the client's ETag or
+    Last-Modified still matches, see `conditional.list_validators`. Switched off with
+    CONTACT_LIST_CONDITIONAL_REQUESTS = False, under the cached and estimate count strategies and for
+    cursor pages, which exist to avoid the scan of all filtered rows.
+    """
+    validator_fields = ('updated_on',)
+    # (count, count strategy) of the filtered rows, reused by the paginator
+    known_count = None
+
+    def get_list_validators(self, queryset):
+        if not conditional.get_list_conditional_requests() \
+                or isinstance(self.paginator, StandardResultsSetCursorPagination):
+            return None
+        validators, self.known_count = conditional.list_validators(self.request, queryset, self.validator_fields)
+        return validators
+
+
+class ContactBookListView(ReplicaReadMixin, FastListMixin, ConditionalListMixin, PaginationModeMixin,
+                          generics.ListAPIView):
     serializer_class = ContactBookSerializer
-    filter_backends = (CustomSearch, filters.OrderingFilter, DjangoFilterBackend)
+    values_serializer = contact_book_rows
+    # search runs last so its relevance ordering is not replaced by the default ordering
+    filter_backends = (filters.OrderingFilter, DjangoFilterBackend, FullTextSearch)
     filter_class = ContactBookFilter
     ordering_fields = ('-id',)
+    ordering = ('-id',)
     search_fields = ('id', 'name')
 
     def list(self, request, *args, **kwargs):
@@ -29,100 +95,167 @@ class ContactBookListView(generics.ListAPIView):
         :return:
         """
         queryset = self.filter_queryset(self.get_queryset())
+        validators = self.get_list_validators(queryset)
+        response = conditional.not_modified(request, validators) if validators else None
+        if response is not None:
+            return response
 
         data = {"status": "Success", "status_code": status.HTTP_200_OK, "msg": "Contact Books"}
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            data["data"] = serializer.data
-            return self.get_paginated_response(data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        data["data"] = serializer.data
-        return Response(data)
+            data["data"] = self.serialize_list(page)
+            response = self.get_paginated_response(data)
+        else:
+            data["data"] = self.serialize_list(queryset)
+            response = Response(data)
+        return conditional.set_validators(response, validators) if validators else response
 
     def get_queryset(self):
-        return ContactBook.objects.order_by('-id')
+        return ContactBook.objects.select_related('created_by', 'changed_by').order_by('-id')
 
 
-class ContactBookViewSet(viewsets.ViewSet):
+class ContactBookViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """
             API for CRUD operation on Contact Book
     """
+    replica_actions = ('retrieve',)
 
     def create(self, request):
         if 'name' not in request.data:
             return Response(data={"error": "Please specify name of contact book"}, status=status.HTTP_400_BAD_REQUEST)
         request.data["created_by"] = self.request.user.username
         request.data["changed_by"] = self.request.user.username
-        serializer = ContactBookSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_201_CREATED, msg='Contact Book is created', data=serializer.data)
+        serializer = ContactBookSerializer(data=request.data, context={'request': request})
+        try:
+            if serializer.is_valid():
+                with transaction.atomic():
+                    serializer.save()
+                return success_response(status=status.HTTP_201_CREATED, msg='Contact Book is created',
+                                        data=serializer.data)
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     def update(self, request, pk=None):
         """
-
+        If-Match / If-Unmodified-Since are checked against the locked row, 412 when it changed since.
         :param request:
         :param pk:
         :return:
         """
         request.data["changed_by"] = self.request.user.username
-        instance = get_or_none(ContactBook, id=pk)
-        if not isinstance(instance, ContactBook):
-            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
-                                  status=status.HTTP_404_NOT_FOUND)
-        serializer = ContactBookSerializer(instance=instance, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
-                                    data=serializer.data)
+        try:
+            with transaction.atomic():
+                instance = get_or_none(ContactBook, select_related=('created_by', 'changed_by'), for_update=True,
+                                       id=pk)
+                if not isinstance(instance, ContactBook):
+                    return error_response(data={"error": "Contact Book does not exist"},
+                                          msg='ContactBook does not exists', status=status.HTTP_404_NOT_FOUND)
+                response = conditional.precondition_failed(request, ContactBook, ContactBookSerializer, instance,
+                                                           msg='Contact Book was modified')
+                if response is not None:
+                    return response
+                serializer = ContactBookSerializer(instance=instance, data=request.data,
+                                                   context={'request': request})
+                if serializer.is_valid():
+                    serializer.save()
+                    cache.invalidate(ContactBook, instance.id)
+                    response = success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
+                                                data=serializer.data)
+                    return conditional.set_validators(
+                        response, conditional.payload_validators(request, ContactBook, serializer.data))
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     def partial_update(self, request, pk=None):
         """
-
+        If-Match / If-Unmodified-Since are checked against the locked row, 412 when it changed since.
         :param request:
         :param pk:
         :return:
         """
         request.data["changed_by"] = self.request.user.username
-        instance = get_or_none(ContactBook, id=pk)
-        if not isinstance(instance, ContactBook):
-            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
-                                  status=status.HTTP_404_NOT_FOUND)
-        serializer = ContactBookSerializer(instance=instance, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
-                                    data=serializer.data)
+        try:
+            with transaction.atomic():
+                instance = get_or_none(ContactBook, select_related=('created_by', 'changed_by'), for_update=True,
+                                       id=pk)
+                if not isinstance(instance, ContactBook):
+                    return error_response(data={"error": "Contact Book does not exist"},
+                                          msg='ContactBook does not exists', status=status.HTTP_404_NOT_FOUND)
+                response = conditional.precondition_failed(request, ContactBook, ContactBookSerializer, instance,
+                                                           msg='Contact Book was modified')
+                if response is not None:
+                    return response
+                serializer = ContactBookSerializer(instance=instance, data=request.data, partial=True,
+                                                   context={'request': request})
+                if serializer.is_valid():
+                    serializer.save()
+                    cache.invalidate(ContactBook, instance.id)
+                    response = success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
+                                                data=serializer.data)
+                    return conditional.set_validators(
+                        response, conditional.payload_validators(request, ContactBook, serializer.data))
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     @staticmethod
     def retrieve(request, pk=None):
         """
-
+        Answers 304 when the client's ETag matches the cached payload, without rendering it.
         :param request:
         :param pk:
         :return:
         """
-        instance = get_or_none(ContactBook, id=pk)
-        if isinstance(instance, ContactBook):
-            serializer = ContactBookSerializer(instance=instance)
-            return success_response(data=serializer.data, status=status.HTTP_200_OK, msg='success')
+        def load():
+            instance = get_or_none(ContactBook, select_related=('created_by', 'changed_by'), id=pk)
+            if isinstance(instance, ContactBook):
+                with instrumentation.timed('serialize'):
+                    return ContactBookSerializer(instance=instance).data
+            return None
+
+        data = cache.get_or_load(ContactBook, pk, load)
+        if data is not None:
+            validators = conditional.payload_validators(request, ContactBook, data)
+            response = conditional.not_modified(request, validators)
+            if response is not None:
+                return response
+            return conditional.set_validators(success_response(data=data, status=status.HTTP_200_OK, msg='success'),
+                                              validators)
         return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
                               status=status.HTTP_404_NOT_FOUND)
 
     def soft_delete(self, request, pk):
-        contact_book = get_or_none(ContactBook, id=pk)
+        """
+        `?background=true` marks the contact book deleted right away and soft deletes its contacts
+        in chunks from a worker, progress is reported by the contact-book-delete-job endpoint.
+        :param request:
+        :param pk:
+        :return:
+        """
+        contact_book = get_or_none(ContactBook, only=('id', 'deleted', 'deleted_on', 'updated_on'), id=pk)
         if isinstance(contact_book, ContactBook):
             if contact_book.deleted:
                 return error_response(status=status.HTTP_400_BAD_REQUEST, msg="Already deleted", data={})
             contact_book.deleted = True
-            contact_book.deleted_on = datetime.now()
-            contact_book.save()
-            contact_book.contacts.update(deleted=True, deleted_on=datetime.now())
+            contact_book.deleted_on = timezone.now()
+            if request.query_params.get('background', '').lower() in ('1', 'true', 'yes'):
+                with transaction.atomic():
+                    contact_book.save()
+                    job = ContactBookDeletionJob.objects.create(
+                        contact_book=contact_book, deleted_on=contact_book.deleted_on, created_by=request.user)
+                    enqueue_contact_book_deletion(job)
+                cache.invalidate(ContactBook, contact_book.id)
+                return success_response(msg="id: {} deletion started".format(pk),
+                                        data=ContactBookDeletionJobSerializer(instance=job).data,
+                                        status=status.HTTP_202_ACCEPTED)
+            with transaction.atomic():
+                contact_book.save()
+                deleted = contact_book.contacts.filter(deleted=False).update(
+                    deleted=True, deleted_on=contact_book.deleted_on, updated_on=contact_book.deleted_on)
+                stats.contacts_soft_deleted({contact_book.id: deleted}, changed_on=contact_book.deleted_on)
+            cache.invalidate(ContactBook, contact_book.id)
             return success_response(
                 msg="id: {} deleted successful".format(pk), data={}, status=status.HTTP_202_ACCEPTED)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg="{} does not exists".format(pk), data={})
@@ -135,15 +268,131 @@ class ContactBookViewSet(viewsets.ViewSet):
             return error_response(status=status.HTTP_400_BAD_REQUEST, msg="{} does not exists".format(pk), data={})
         if isinstance(contact_book, ContactBook):
             ContactBook.objects.filter(id=pk).delete()
-            print(ContactBook.objects.filter(id=pk))
+            cache.invalidate(ContactBook, contact_book.id)
             return success_response(msg='{} is deleted'.format(pk), status=status.HTTP_202_ACCEPTED, data={})
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg="{} does not exists".format(pk), data={})
 
 
-class ContactViewSet(viewsets.ViewSet):
+class ContactBookDeletionJobView(APIView):
+    """
+            API for the status of a background contact book soft delete
+    """
+
+    def get(self, request, pk=None):
+        try:
+            job = ContactBookDeletionJob.objects.get(id=pk)
+        except ContactBookDeletionJob.DoesNotExist:
+            return error_response(data={"error": "Deletion job does not exist"}, msg='Deletion job does not exists',
+                                  status=status.HTTP_404_NOT_FOUND)
+        return success_response(data=ContactBookDeletionJobSerializer(instance=job).data, status=status.HTTP_200_OK,
+                                msg='success')
+
+
+class ContactBookStatsView(APIView):
+    """
+            API for the stored contact counters of a contact book
+    """
+
+    def get(self, request, pk=None):
+        """
+        :param request:
+        :param pk:
+        :return: live and deleted contact counts and time of the last contact change
+        """
+        if not ContactBook.objects.filter(id=pk).exists():
+            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
+                                  status=status.HTTP_404_NOT_FOUND)
+        return success_response(data=ContactBookStatsSerializer(instance=stats.get_contact_book_stats(pk)).data,
+                                status=status.HTTP_200_OK, msg='success')
+
+
+class ContactBookChangesView(APIView):
+    """
+            API for the incremental sync feed of the contacts of a contact book, always read from the
+            primary: a cursor past rows a replica has not received yet would skip them for good
+    """
+
+    def get(self, request, pk=None):
+        """
+        `cursor` query param is the cursor of the previous page, none starts from the beginning.
+        `page_size` query param caps the number of contacts, at most CONTACT_SYNC_MAX_PAGE_SIZE.
+        :param request:
+        :param pk:
+        :return: contacts changed after the cursor, soft deleted ones with deleted true, the cursor to
+            continue from and whether more changes are ready
+        """
+        contact_book = get_or_none(ContactBook, only=('id',), id=pk)
+        if not isinstance(contact_book, ContactBook):
+            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
+                                  status=status.HTTP_404_NOT_FOUND)
+        try:
+            page_size = int(request.query_params.get('page_size', 0))
+        except ValueError:
+            page_size = 0
+        page_size = min(page_size, get_sync_max_page_size()) if page_size > 0 else None
+        try:
+            contacts, cursor, has_more = changed_contacts(contact_book.id, request.query_params.get('cursor'),
+                                                          page_size=page_size)
+        except InvalidCursor:
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid cursor',
+                                  data={"error": "Please send a cursor returned by this endpoint"})
+        return success_response(data={"contacts": contacts, "cursor": cursor, "has_more": has_more},
+                                status=status.HTTP_200_OK, msg='success')
+
+
+class ContactBookDuplicatesView(APIView):
+    """
+            API for the contacts of a contact book sharing their normalized email with other contacts
+    """
+
+    def get(self, request, pk=None):
+        """
+        The report is cached per book for CONTACT_DUPLICATE_CACHE_TIMEOUT seconds, `refresh=true`
+        recomputes it.
+        :param request:
+        :param pk:
+        :return: clusters of contacts per normalized email with the contact books they are in
+        """
+        contact_book = get_or_none(ContactBook, only=('id',), id=pk)
+        if not isinstance(contact_book, ContactBook):
+            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
+                                  status=status.HTTP_404_NOT_FOUND)
+        refresh = request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes')
+        return success_response(data=get_contact_book_duplicates(contact_book.id, refresh=refresh),
+                                status=status.HTTP_200_OK, msg='success')
+
+
+class ContactBookExportView(APIView):
+    """
+            API for streaming export of all live contacts of a contact book
+    """
+
+    def get(self, request, pk=None):
+        """
+        `output` query param selects csv (default) or ndjson.
+        :param request:
+        :param pk:
+        :return: streamed contacts of the contact book
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_STREAMS:
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid output format',
+                                  data={"error": "output must be one of {}".format(', '.join(sorted(EXPORT_STREAMS)))})
+        contact_book = get_or_none(ContactBook, only=('id',), id=pk)
+        if not isinstance(contact_book, ContactBook):
+            return error_response(data={"error": "Contact Book does not exist"}, msg='ContactBook does not exists',
+                                  status=status.HTTP_404_NOT_FOUND)
+        response = StreamingHttpResponse(EXPORT_STREAMS[output](contact_book.id),
+                                         content_type=EXPORT_CONTENT_TYPES[output])
+        response['Content-Disposition'] = 'attachment; filename="contact-book-{}.{}"'.format(contact_book.id, output)
+        return response
+
+
+class ContactViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """
             API for CRUD operation on Contact
     """
+    replica_actions = ('retrieve',)
 
     def create(self, request):
         """
@@ -153,89 +402,219 @@ class ContactViewSet(viewsets.ViewSet):
         """
         request.data["created_by"] = self.request.user.username
         request.data["changed_by"] = self.request.user.username
-        serializer = ContactSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_201_CREATED, msg='Contact  is created', data=serializer.data)
+        serializer = ContactSerializer(data=request.data, context={'request': request})
+        try:
+            if serializer.is_valid():
+                with transaction.atomic():
+                    contact = serializer.save()
+                    stats.contact_changed(after=(contact.contact_book_id, contact.deleted))
+                return success_response(status=status.HTTP_201_CREATED, msg='Contact  is created',
+                                        data=serializer.data)
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     def update(self, request, pk=None):
         """
-
+        If-Match / If-Unmodified-Since are checked against the locked row, 412 when it changed since.
         :param request:
         :param pk:
         :return:
         """
         request.data["changed_by"] = self.request.user.username
-        instance = get_or_none(Contact, id=pk)
-        if not isinstance(instance, Contact):
-            return error_response(data={"error": "Contact Book does not exist"}, msg='Contact does not exists',
-                                  status=status.HTTP_404_NOT_FOUND)
-        serializer = ContactSerializer(instance, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
-                                    data=serializer.data)
+        try:
+            with transaction.atomic():
+                instance = get_or_none(Contact, select_related=('contact_book', 'created_by', 'changed_by'),
+                                       for_update=True, id=pk)
+                if not isinstance(instance, Contact):
+                    return error_response(data={"error": "Contact Book does not exist"}, msg='Contact does not exists',
+                                          status=status.HTTP_404_NOT_FOUND)
+                response = conditional.precondition_failed(request, Contact, ContactSerializer, instance,
+                                                           msg='Contact was modified')
+                if response is not None:
+                    return response
+                serializer = ContactSerializer(instance, data=request.data,
+                                               context={'request': request})
+                if serializer.is_valid():
+                    # the instance is updated in place
+                    before = (instance.contact_book_id, instance.deleted)
+                    contact = serializer.save()
+                    stats.contact_changed(before, (contact.contact_book_id, contact.deleted))
+                    cache.invalidate(Contact, instance.id)
+                    response = success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
+                                                data=serializer.data)
+                    return conditional.set_validators(
+                        response, conditional.payload_validators(request, Contact, serializer.data))
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     def partial_update(self, request, pk=None):
         """
-
+        If-Match / If-Unmodified-Since are checked against the locked row, 412 when it changed since.
         :param request:
         :param pk:
         :return:
         """
         request.data["changed_by"] = self.request.user.username
-        instance = get_or_none(Contact, id=pk)
-        if not isinstance(instance, Contact):
-            return error_response(data={"error": "Contact Book does not exist"}, msg='Contact does not exists',
-                                  status=status.HTTP_404_NOT_FOUND)
-        serializer = ContactSerializer(instance=instance, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
-                                    data=serializer.data)
+        try:
+            with transaction.atomic():
+                instance = get_or_none(Contact, select_related=('contact_book', 'created_by', 'changed_by'),
+                                       for_update=True, id=pk)
+                if not isinstance(instance, Contact):
+                    return error_response(data={"error": "Contact Book does not exist"}, msg='Contact does not exists',
+                                          status=status.HTTP_404_NOT_FOUND)
+                response = conditional.precondition_failed(request, Contact, ContactSerializer, instance,
+                                                           msg='Contact was modified')
+                if response is not None:
+                    return response
+                serializer = ContactSerializer(instance=instance, data=request.data, partial=True,
+                                               context={'request': request})
+                if serializer.is_valid():
+                    # the instance is updated in place
+                    before = (instance.contact_book_id, instance.deleted)
+                    contact = serializer.save()
+                    stats.contact_changed(before, (contact.contact_book_id, contact.deleted))
+                    cache.invalidate(Contact, instance.id)
+                    response = success_response(status=status.HTTP_202_ACCEPTED, msg='Contact Book is updated',
+                                                data=serializer.data)
+                    return conditional.set_validators(
+                        response, conditional.payload_validators(request, Contact, serializer.data))
+        except IntegrityError:
+            return unique_violation_response(serializer)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
 
     @staticmethod
     def retrieve(request, pk=None):
         """
+        Answers 304 when the client's ETag matches the cached payload, without rendering it.
         :param request:
         :param pk:
         :return:
         """
-        instance = get_or_none(Contact, id=pk)
-        if isinstance(instance, Contact):
-            serializer = ContactSerializer(instance=instance)
-            return success_response(data=serializer.data, status=status.HTTP_200_OK, msg='success')
+        def dependencies():
+            # contact_book_name is part of the payload, so book changes must drop it as well; the
+            # book's version has to be read before the payload is loaded
+            contact = get_or_none(Contact, only=('id', 'contact_book'), id=pk)
+            return ((ContactBook, contact.contact_book_id),) if contact is not None else ()
+
+        def load():
+            instance = get_or_none(Contact, select_related=('contact_book', 'created_by', 'changed_by'), id=pk)
+            if isinstance(instance, Contact):
+                with instrumentation.timed('serialize'):
+                    return ContactSerializer(instance=instance).data
+            return None
+
+        data = cache.get_or_load(Contact, pk, load, dependencies)
+        if data is not None:
+            validators = conditional.payload_validators(request, Contact, data)
+            response = conditional.not_modified(request, validators)
+            if response is not None:
+                return response
+            return conditional.set_validators(success_response(data=data, status=status.HTTP_200_OK, msg='success'),
+                                              validators)
         return error_response(data={"error": "Contact Book does not exist"}, msg='Contact does not exists',
                               status=status.HTTP_404_NOT_FOUND)
 
+    @staticmethod
+    def bulk_retrieve(request):
+        """
+        Body: {"ids": [...]} or {"keys": [{"contact_book": ..., "email": ...}, ...]}
+        :param request:
+        :return: found, deleted or missing status for every requested id or key
+        """
+        serializer = ContactBulkRetrieveSerializer(data=request.data, context={'max_keys': get_bulk_retrieve_max_keys()})
+        if not serializer.is_valid():
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
+        results = retrieve_contacts(ids=serializer.validated_data.get('ids'),
+                                    keys=serializer.validated_data.get('keys'))
+        return success_response(data=results, status=status.HTTP_200_OK, msg='success')
+
+    def bulk_partial_update(self, request):
+        """
+        Body: {"ids": [...]} or {"filter": {"name": ..., "email": ...}}, plus {"data": {"name": ..., "contact_book": ...}}
+        applied to every selected live contact in one transaction.
+        :param request:
+        :return: number of updated contacts
+        """
+        serializer = ContactBulkUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
+        changes = serializer.validated_data['data']
+        max_rows = get_bulk_update_max_rows()
+        with transaction.atomic():
+            ids = lock_contact_ids(serializer.validated_data['queryset'], max_rows)
+            if ids is None:
+                return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Too many contacts',
+                                      data={"error": "At most {} contacts can be updated per request".format(max_rows)})
+            if 'contact_book' in changes:
+                conflicts = find_move_conflicts(ids, changes['contact_book'])
+                if conflicts:
+                    return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data={
+                        "non_field_errors": ["The fields contact_book, email must make a unique set."],
+                        "emails": conflicts})
+            updated = bulk_update_contacts(ids, changes, request.user)
+            cache.invalidate_many(Contact, ids)
+        return success_response(status=status.HTTP_202_ACCEPTED, msg='Contacts are updated', data={"updated": updated})
+
+    def bulk_soft_delete(self, request):
+        """
+        Body: {"ids": [...]} or {"filter": {"name": ..., "email": ...}}
+        :param request:
+        :return: number of deleted contacts
+        """
+        serializer = ContactSelectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=serializer.errors)
+        max_rows = get_bulk_update_max_rows()
+        with transaction.atomic():
+            ids = lock_contact_ids(serializer.validated_data['queryset'], max_rows)
+            if ids is None:
+                return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Too many contacts',
+                                      data={"error": "At most {} contacts can be deleted per request".format(max_rows)})
+            deleted = bulk_soft_delete_contacts(ids, request.user)
+            cache.invalidate_many(Contact, ids)
+        return success_response(status=status.HTTP_202_ACCEPTED, msg='Contacts are deleted', data={"deleted": deleted})
+
     def soft_delete(self, request, pk):
-        contact = get_or_none(Contact, id=pk)
+        with transaction.atomic():
+            # locked, a concurrent delete of the same contact waits and then finds it deleted, so the
+            # counters move once
+            contact = get_or_none(Contact, only=('id', 'contact_book', 'deleted', 'deleted_on', 'updated_on'),
+                                  for_update=True, id=pk)
+            if isinstance(contact, Contact):
+                contact.deleted = True
+                contact.deleted_on = datetime.now()
+                contact.save()
+                stats.contact_changed((contact.contact_book_id, False), (contact.contact_book_id, True))
+                cache.invalidate(Contact, contact.id)
         if isinstance(contact, Contact):
-            if contact.deleted:
-                return error_response(status=status.HTTP_400_BAD_REQUEST, msg="Already deleted", data={})
-            contact.deleted = True
-            contact.deleted_on = datetime.now()
-            contact.save()
             return success_response(
                 msg="id: {} deleted successful".format(pk), data={}, status=status.HTTP_202_ACCEPTED)
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg="{} does not exists".format(pk), data={})
 
     def hard_delete(self, request, pk):
-        contact = get_or_none(Contact, id=pk)
+        contact = get_or_none(Contact, only=('id', 'contact_book', 'deleted'), id=pk)
         if isinstance(contact, Contact):
-            Contact.objects.filter(id=pk).delete()
+            with transaction.atomic():
+                if Contact.objects.filter(id=pk).delete()[0]:
+                    stats.contact_changed(before=(contact.contact_book_id, contact.deleted))
+            cache.invalidate(Contact, contact.id)
             return success_response(msg='{} is deleted'.format(pk), status=status.HTTP_202_ACCEPTED, data={})
         return error_response(status=status.HTTP_400_BAD_REQUEST, msg="{} does not exists".format(pk), data={})
 
 
-class ContactListView(generics.ListAPIView):
+class ContactListView(ReplicaReadMixin, FastListMixin, ConditionalListMixin, PaginationModeMixin,
+                      generics.ListAPIView):
     serializer_class = ContactSerializer
-    filter_backends = (CustomSearch, filters.OrderingFilter, DjangoFilterBackend)
+    values_serializer = contact_rows
+    # contact_book_name is part of every row
+    validator_fields = ('updated_on', 'contact_book__updated_on')
+    # search runs last so its relevance ordering is not replaced by the default ordering
+    filter_backends = (filters.OrderingFilter, DjangoFilterBackend, FullTextSearch)
     filter_class = ContactFilter
     ordering_fields = ('-id',)
+    ordering = ('-id',)
     search_fields = ('id', 'name','email')
 
     def list(self, request, *args, **kwargs):
@@ -246,24 +625,94 @@ class ContactListView(generics.ListAPIView):
         :return: list of contacts
         """
         queryset = self.filter_queryset(self.get_queryset())
+        validators = self.get_list_validators(queryset)
+        response = conditional.not_modified(request, validators) if validators else None
+        if response is not None:
+            return response
 
         data = {"status": "Success", "status_code": status.HTTP_200_OK, "msg": "Contact"}
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            data["data"] = serializer.data
-            return self.get_paginated_response(data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        data["data"] = serializer.data
-        return Response(data)
+            data["data"] = self.serialize_list(page)
+            response = self.get_paginated_response(data)
+        else:
+            data["data"] = self.serialize_list(queryset)
+            response = Response(data)
+        return conditional.set_validators(response, validators) if validators else response
 
     def get_queryset(self):
         """
 
         :return:
         """
-        return Contact.objects.all()
+        return Contact.objects.select_related('contact_book', 'created_by', 'changed_by')
+
+
+class ContactImportView(APIView):
+    """
+            API for bulk import of contacts from a JSON array or a CSV upload
+    """
+    parser_classes = (JSONParser, MultiPartParser)
+
+    def post(self, request):
+        """
+        JSON body: list of {"name", "email", "contact_book"} objects.
+        Multipart body: `file` csv with name, email and contact_book columns.
+        `contact_book` query/form param is used for rows without a contact book.
+        :param request:
+        :return: per row import report
+        """
+        contact_book = request.query_params.get('contact_book')
+        if isinstance(request.data, list):
+            rows = request.data
+        elif 'file' in request.FILES:
+            rows = read_csv_rows(request.FILES['file'])
+            contact_book = request.data.get('contact_book', contact_book)
+        else:
+            return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data',
+                                  data={"error": "Please send a JSON array of contacts or a CSV file"})
+        importer = ContactImporter(user=request.user, contact_book=contact_book)
+        try:
+            with transaction.atomic():
+                report = importer.run(rows)
+        except IntegrityError:
+            return error_response(status=status.HTTP_409_CONFLICT, msg='Contacts were modified during import',
+                                  data={"error": "Duplicate contacts were created concurrently, please retry"})
+        if report['created']:
+            return success_response(status=status.HTTP_201_CREATED, msg='Contacts are imported', data=report)
+        return error_response(status=status.HTTP_400_BAD_REQUEST, msg='Invalid data', data=report)
+
+
+class DatabaseDiagnosticsView(APIView):
+    """
+            API for the database connection and pool metrics of the serving process
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Metrics are per process: checkouts, waits, open and idle connections of pooled aliases,
+        connects and health checks of every alias.
+        :param request:
+        :return:
+        """
+        return success_response(data=get_connection_stats(), status=status.HTTP_200_OK, msg='success')
+
+
+class MetricsView(APIView):
+    """
+            API for the request metrics of the serving process in the Prometheus text format
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Histograms per url name, method and status of latency, database queries and time, serialize and
+        render time and response size. Metrics are per process, every worker has to be scraped.
+        :param request:
+        :return:
+        """
+        return HttpResponse(instrumentation.registry.exposition(), content_type=METRICS_CONTENT_TYPE)
 
 
 class UserLogin(ObtainAuthToken):
@@ -321,5 +770,6 @@ class UserLogout(APIView):
         :param format:
         :return:
         """
+        # the post_delete receiver of Token invalidates the cached token
         request.user.auth_token.delete()
         return Response({'status': 'success', 'msg': 'Logout Successful'}, status=status.HTTP_200_OK)
@@ -0,0 +1,18 @@
+"""
+Helpers for spawned worker processes; this module is imported before Django is set up in them and
+must not import models.
+"""
+
+
+def init_django_worker(databases=None):
+    """
+    ProcessPoolExecutor initializer: spawned children start without Django set up and never share
+    the parent's database connections.
+    :param databases: database names by alias to use instead of the settings, those of the parent
+    """
+    import django
+    django.setup()
+    if databases:
+        from django.db import connections
+        for alias, name in databases.items():
+            connections[alias].settings_dict['NAME'] = name
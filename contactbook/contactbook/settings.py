@@ -38,10 +38,11 @@ INSTALLED_APPS = [
     'rest_framework',
     'django_filters',
     'rest_framework.authtoken',
-    'contact'
+    'contact.apps.ContactConfig'
 ]
 
 MIDDLEWARE = [
+    'contact.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,16 +50,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'contact.middleware.ReadYourWritesMiddleware',
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'contact.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'contact.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
         'rest_framework.renderers.TemplateHTMLRenderer',
 
@@ -72,6 +74,49 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'contact.pagination.StandardResultsSetPagination',
     'PAGE_SIZE': 10
 }
+# rows validated and inserted per batch by the bulk contact import
+CONTACT_IMPORT_BATCH_SIZE = 1000
+# list endpoints serialize .values() rows instead of one serializer instance per row
+CONTACT_FAST_LIST_SERIALIZATION = True
+# total count of page number list responses: 'exact' COUNT(*), 'cached' per filter signature for
+# CONTACT_LIST_COUNT_CACHE_TIMEOUT seconds, or 'estimate' from the PostgreSQL planner when it
+# expects at least CONTACT_LIST_COUNT_ESTIMATE_THRESHOLD rows. Only 'exact' list responses carry
+# ETags (CONTACT_LIST_CONDITIONAL_REQUESTS), they cost a scan of all filtered rows per request.
+CONTACT_LIST_COUNT_STRATEGY = 'exact'
+CONTACT_LIST_COUNT_CACHE_TIMEOUT = 60
+CONTACT_LIST_COUNT_ESTIMATE_THRESHOLD = 100000
+# list responses carry an ETag/Last-Modified from max(updated_on) and the count of the filtered rows,
+# one aggregate query per request that answers unchanged polls with 304 and doubles as the exact
+# count; ignored under the cached and estimate count strategies and for ?pagination=cursor pages
+CONTACT_LIST_CONDITIONAL_REQUESTS = True
+# most ids or (contact_book, email) keys accepted by one bulk retrieve request
+CONTACT_BULK_RETRIEVE_MAX_KEYS = 1000
+# most contacts changed by one bulk partial update or bulk soft delete request
+CONTACT_BULK_UPDATE_MAX_ROWS = 10000
+# incremental sync feed: default and largest page, and how many seconds recent changes are held back
+# so transactions still committing older timestamps are not skipped by a cursor (on PostgreSQL counted
+# from the start of the oldest open transaction, elsewhere writes must commit within it)
+CONTACT_SYNC_PAGE_SIZE = 500
+CONTACT_SYNC_MAX_PAGE_SIZE = 5000
+CONTACT_SYNC_SETTLE_SECONDS = 5
+# transactions open longer than this stop holding the sync feed back and are logged, their rows may be
+# skipped by clients that synced meanwhile
+CONTACT_SYNC_MAX_TRANSACTION_SECONDS = 300
+# requests taking at least CONTACT_SLOW_REQUEST_SECONDS are logged to contact.slow_requests with up to
+# CONTACT_SLOW_REQUEST_MAX_QUERIES of their slowest SQL statements, None turns the log (and SQL capture) off
+CONTACT_SLOW_REQUEST_SECONDS = float(os.environ['CONTACT_SLOW_REQUEST_SECONDS']) \
+    if os.environ.get('CONTACT_SLOW_REQUEST_SECONDS') else None
+CONTACT_SLOW_REQUEST_MAX_QUERIES = 20
+# duplicate contact detection: contacts or emails per query and seconds a per book report is cached
+CONTACT_DUPLICATE_CHUNK_SIZE = 5000
+CONTACT_DUPLICATE_CACHE_TIMEOUT = 600
+# rows fetched per server-side cursor round trip by the contact book export
+CONTACT_EXPORT_CHUNK_SIZE = 2000
+# background contact book soft delete: contacts updated per transaction and worker threads per process,
+# 0 workers runs the job inline
+CONTACT_BOOK_DELETE_CHUNK_SIZE = 10000
+CONTACT_BOOK_DELETE_WORKERS = 2
+
 ROOT_URLCONF = 'contactbook.urls'
 
 TEMPLATES = [
@@ -103,8 +148,72 @@ DATABASES = {
         'PASSWORD': 'whvc.1900',
         'HOST': 'localhost',
         'PORT': '5432',
+        # persistent connections, checked with SELECT 1 every CONTACT_DB_HEALTH_CHECK_INTERVAL seconds
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+    }
+}
+# DATABASE_POOL_SIZE > 0 shares a pool of at most that many connections between the threads of each
+# process (threaded servers), connections go back to the pool at the end of every request.
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', '0'))
+if DATABASE_POOL_SIZE:
+    DATABASES['default'].update({
+        'ENGINE': 'contact.db.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        # TIMEOUT: seconds to wait for a free connection, MAX_AGE: seconds before a connection is replaced
+        'POOL': {'MAX_SIZE': DATABASE_POOL_SIZE, 'TIMEOUT': 10, 'MAX_AGE': 600},
+    })
+CONTACT_DB_HEALTH_CHECK_INTERVAL = 30
+# Read replicas: every host in the comma separated DATABASE_REPLICA_HOSTS gets an alias with the
+# default credentials. List, search and retrieve requests read from a random replica, the reads of a
+# user stay on the primary for CONTACT_READ_YOUR_WRITES_WINDOW seconds after a write.
+DATABASE_REPLICA_HOSTS = [host for host in os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',') if host]
+for index, host in enumerate(DATABASE_REPLICA_HOSTS):
+    DATABASES['replica_{}'.format(index)] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+CONTACT_DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+CONTACT_READ_YOUR_WRITES_WINDOW = 5
+DATABASE_ROUTERS = ['contact.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# MAX_ENTRIES/CULL_FREQUENCY control eviction of the in-process cache. Set REDIS_URL to share the
+# cache between workers, eviction is then handled by the redis maxmemory-policy (allkeys-lru).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'contactbook',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 3,
+        },
     }
 }
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+
+# read-through cache of contact and contact book retrieve payloads
+CONTACT_CACHE_ALIAS = 'default'
+CONTACT_CACHE_TIMEOUT = 300
+CONTACT_CACHE_LOCK_TIMEOUT = 5
+
+# token to user resolution (user id, username and permission flags), kept in process for
+# TOKEN_CACHE_LOCAL_TIMEOUT and in the shared cache for TOKEN_CACHE_TIMEOUT seconds; a logout, token
+# deletion or change of the user's flags marks the token revoked for the longer of both, every
+# request checks that marker in the shared cache. With the in-process cache backend (no REDIS_URL)
+# tokens are only cached when TOKEN_CACHE_SINGLE_PROCESS says no other worker process serves requests.
+TOKEN_CACHE_MAX_ENTRIES = 10000
+TOKEN_CACHE_LOCAL_TIMEOUT = 60
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_SINGLE_PROCESS = False
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -0,0 +1,22 @@
+"""
+Settings for running the tests without a database server:
+python manage.py test --settings=contactbook.settings_test
+
+Two SQLite databases stand in for the primary and a read replica, replica routing is only switched
+on by the tests that exercise it (CONTACT_DATABASE_REPLICAS).
+"""
+from contactbook.settings import *  # noqa
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+    },
+}
+CONTACT_DATABASE_REPLICAS = []
+# the test runner is a single process, tokens are cached in the in-process cache
+TOKEN_CACHE_SINGLE_PROCESS = True